@@ -0,0 +1,113 @@
+"""
+geotechTools - Copyright 2024 S.M.Arndt, Cavroc Pty Ltd
+Visit https://cavroc.com/ for more information on IUCM and StopeX
+
+This file is part of geotechTools (https://github.com/SMArndt/geotechTools).
+
+geotechTools is free software: you can redistribute it and/or modify it under the
+terms of the GNU General Public License as published by the Free Software Foundation.
+
+geotechTools is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with geotechTools.
+If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# ---------------------------------------------------------------------------
+# notes
+# ---------------------------------------------------------------------------
+# - package interface: import geotechTools as gt; gt.xyzData(...), gt.plot3D(...)
+# - names are imported from their module on first access, 'import geotechTools'
+#   loads neither numpy-stl, matplotlib nor scipy
+# - the modules import each other by name (import config, from xyzData import ...),
+#   so the package folder is appended to sys.path unless they are importable already
+# - collision: the module names are generic (config, pipeline, benchmark, ...), a
+#   module of the same name earlier on sys.path or already imported wins over ours;
+#   such names are reported on import and raise ImportError on access
+
+# ---------------------------------------------------------------------------
+# imports
+# ---------------------------------------------------------------------------
+
+import os
+import sys
+import importlib
+import importlib.util
+
+# ---------------------------------------------------------------------------
+# public names {name: module}
+# ---------------------------------------------------------------------------
+
+api = {
+    'config': 'config',
+    'xyzData': 'xyzData', 'array3D_BBox': 'xyzData', 'array3D_IPR': 'xyzData',
+    'array3D_Lattice': 'xyzData', 'xyzLattice': 'xyzData',
+    'planePoints': 'xyzData', 'linePoints': 'xyzData', 'boxPoints': 'xyzData',
+    'parseTime': 'xyzData', 'toTime': 'xyzData', 'array3D_Keys': 'xyzData',
+    'gridData': 'gridData',
+    'octreeData': 'octreeData', 'radixArgsort': 'octreeData',
+    'stlGeom': 'stlGeom', 'stlIndex': 'stlGeom', 'getIndex': 'stlGeom',
+    'triangleBoxOverlap': 'stlGeom', 'voxelizeVectors': 'stlGeom', 'decimateVectors': 'stlGeom',
+    'mortonKey': 'stlGeom', 'mortonIJK': 'stlGeom',
+    'rot_x': 'stressUtils', 'rot_y': 'stressUtils', 'rot_z': 'stressUtils',
+    'unpackStress': 'stressUtils', 'packStress': 'stressUtils',
+    'getCartesianStress': 'stressUtils', 'getPrincipalStress': 'stressUtils',
+    'getStressOrientation': 'stressUtils', 'getPlaneOrientation': 'stressUtils', 'getPlaneNormal': 'stressUtils',
+    'stressInvariants': 'stressUtils',
+    'magnitudeCompleteness': 'seismicUtils', 'bValue': 'seismicUtils', 'groupStats': 'seismicUtils',
+    'neighbourStats': 'seismicUtils', 'gridHazard': 'seismicUtils',
+    'plungeTrendToVectors': 'orientationUtils', 'vectorsToPlungeTrend': 'orientationUtils',
+    'dipDirToNormals': 'orientationUtils', 'normalsToDipDir': 'orientationUtils', 'principalAxes': 'orientationUtils',
+    'hemisphereGrid': 'orientationUtils', 'projectVectors': 'orientationUtils', 'orientationDensity': 'orientationUtils',
+    'groupOrientation': 'orientationUtils', 'gridOrientation': 'orientationUtils',
+    'pipeline': 'pipeline', 'stage': 'pipeline', 'tileBoxes': 'pipeline',
+    'plot3D': 'plot3D', 'plot3DVoxel': 'plot3D', 'plot3DCube': 'plot3D', 'plot3Dgeo': 'plot3D',
+}
+
+__all__ = list(api)
+
+# ---------------------------------------------------------------------------
+# module path
+# ---------------------------------------------------------------------------
+
+path = os.path.dirname(os.path.abspath(__file__))
+
+def origin(moduleName):
+    """
+    folder moduleName is imported from, None if it is not importable
+    """
+
+    module = sys.modules.get(moduleName)
+    if module is not None:
+        fileName = getattr(module, '__file__', None)
+    else:
+        try:
+            spec = importlib.util.find_spec(moduleName)
+        except (ImportError, ValueError):
+            spec = None
+        fileName = None if spec is None else spec.origin
+    return None if fileName is None else os.path.dirname(os.path.abspath(fileName))
+
+if not all(origin(m)==path for m in set(api.values())) and path not in sys.path:
+    sys.path.append(path)
+
+collisions = sorted(m for m in set(api.values()) if origin(m)!=path)
+if collisions:
+    print (f"Warning: geotechTools modules {collisions} are shadowed by modules of the same name")
+
+def __getattr__(name):
+    if name not in api:
+        raise AttributeError(f"module 'geotechTools' has no attribute '{name}'")
+
+    if origin(api[name])!=path:
+        print (f"Error: module '{api[name]}' is imported from {origin(api[name])}, not {path}")
+        raise ImportError
+    module = importlib.import_module(api[name])
+    value = module if name==api[name] and not hasattr(module, name) else getattr(module, name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
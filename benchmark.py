@@ -0,0 +1,352 @@
+"""
+benchmark.py - Copyright 2024 S.M.Arndt, Cavroc Pty Ltd
+Visit https://cavroc.com/ for more information on IUCM and StopeX
+
+This file is part of geotechTools (https://github.com/SMArndt/geotechTools).
+
+geotechTools is free software: you can redistribute it and/or modify it under the
+terms of the GNU General Public License as published by the Free Software Foundation.
+
+geotechTools is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with geotechTools.
+If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# ---------------------------------------------------------------------------
+# notes
+# ---------------------------------------------------------------------------
+# - synthetic data modelled on SampleDataset.csv, regular_stress.csv and SampleMineGeo.stl
+# - times and peak memory (tracemalloc) of the hot paths, appended to a JSON history
+# - python benchmark.py --sizes 1e3 1e4 1e5 --history benchmark.json
+# - python benchmark.py --compare -2 -1 (compare last two runs in the history)
+# - python benchmark.py --cases import (import time of modules and package only)
+
+# ---------------------------------------------------------------------------
+# imports
+# ---------------------------------------------------------------------------
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import subprocess
+
+import numpy as np
+
+# ---------------------------------------------------------------------------
+# synthetic data generators
+# ---------------------------------------------------------------------------
+
+catalogueHeader = ['X','Y','Z','ID','Date','Location Residual','Sensors Hit','Sensors Used', \
+                   'Apparent Volume','Seismic Moment','Local Magnitude']
+
+stressHeader = ['x','y','z','colour-xz','colour-yz','colour-xy','Sxx','Syy','Szz','Sxy','Sxz','Syz']
+
+def syntheticCatalogue(fileName, n, seed=0, chunk=10**6):
+    """
+    write seismic catalogue of n events like SampleDataset.csv
+
+    - clustered hypocentres around mine-scale centres (x 2550-3120, y 4440-4960, z 840-1560)
+    - Gutenberg-Richter magnitudes (b=1, Mmin=-3.4), moment from log10 M0 = 1.5 M + 9.1
+    - one event per 10 minutes from 2024-01-01, about 1% of magnitudes missing (nan)
+    """
+
+    rng = np.random.default_rng(seed)
+    centres = rng.uniform((2650,4540,940), (3020,4860,1460), (32,3))
+    t0 = np.datetime64('2024-01-01T00:00:00')
+
+    with open(fileName, 'w', newline='') as f:
+        f.write(','.join(catalogueHeader)+'\n')
+        for c in range(0, n, chunk):
+            m = min(chunk, n-c)
+            xyz = centres[rng.integers(0,len(centres),m)] + rng.normal(0, 40, (m,3))
+            mag = -3.4 - np.log10(rng.random(m))
+            mag[rng.random(m) < 0.01] = np.nan
+            hit = rng.integers(4, 20, m)
+            rows = np.column_stack((xyz, np.arange(c,c+m), \
+                                    rng.exponential(3.5, m), hit, np.minimum(hit, rng.integers(3,19,m)), \
+                                    10**rng.normal(4.2, 0.6, m), 10**(1.5*mag+9.1), mag))
+            date = np.datetime_as_string(t0 + np.arange(c,c+m)*np.timedelta64(600,'s'), unit='s')
+            for r, d in zip(rows.tolist(), date.tolist()):
+                f.write('%.2f,%.2f,%.2f,%d,%s,%.2f,%d,%d,%.4g,%.4g,%.2f\n' % (*r[:4], d, *r[4:]))
+
+    return fileName
+
+def syntheticStress(fileName, n, seed=0):
+    """
+    write stress model on a regular lattice of about n nodes like regular_stress.csv
+
+    - 50 m spacing from (2600,4500,1000), stress increasing with depth plus noise
+    """
+
+    rng = np.random.default_rng(seed)
+    k = max(int(round(pow(n,1./3.))),2)
+    x, y, z = np.meshgrid(2600+50.*np.arange(k), 4500+50.*np.arange(k), 1000+50.*np.arange(k), indexing='ij')
+    xyz = np.column_stack((x.ravel(), y.ravel(), z.ravel()))
+    d = 1 + (xyz[:,2]-1000)/1000
+    s = np.column_stack((3.7e7*d, 2.9e7*d, 2.65e7*d, 1.06e7*d, 5.3e6*d, 2.65e6*d))
+    s *= 1 + rng.normal(0, 0.02, s.shape)
+    colour = np.column_stack((10+xyz[:,0]/100%10, xyz[:,1]/100%10, 10+xyz[:,2]/100%10))
+    np.savetxt(fileName, np.hstack((xyz, colour, s)), delimiter=',', fmt='%.3E', \
+               header=','.join(stressHeader), comments='')
+
+    return fileName
+
+def syntheticMesh(fileName, nTriangles, seed=0):
+    """
+    write binary stl of closed boxes (drives and stopes) with about nTriangles triangles
+    like SampleMineGeo.stl
+    """
+
+    import stl
+
+    rng = np.random.default_rng(seed)
+    nBox = max(nTriangles//12, 1)
+    corner = np.array([[0,0,0],[1,0,0],[1,1,0],[0,1,0],[0,0,1],[1,0,1],[1,1,1],[0,1,1]], dtype=float)
+    quads = [(0,3,2,1),(4,5,6,7),(0,1,5,4),(1,2,6,5),(2,3,7,6),(3,0,4,7)]
+    tri = np.array([t for q in quads for t in ((q[0],q[1],q[2]),(q[0],q[2],q[3]))])
+
+    lo = rng.uniform((2635,4620,1000), (2900,4800,1120), (nBox,3))
+    size = rng.uniform((4,4,4), (40,12,30), (nBox,3))
+    data = np.zeros(nBox*12, dtype=stl.mesh.Mesh.dtype)
+    data['vectors'] = (lo[:,None,None,:] + corner[tri][None,:,:,:]*size[:,None,None,:]).reshape(-1,3,3)
+    stl.mesh.Mesh(data).save(fileName, mode=stl.Mode.BINARY)
+
+    return fileName
+
+# ---------------------------------------------------------------------------
+# benchmark cases
+# ---------------------------------------------------------------------------
+
+def measure(function, repeat=1, setup=None):
+    """
+    best time of repeat untraced calls and peak traced memory (MB) of one more call,
+    tracemalloc slows Python heavy code down severalfold
+
+    setup: untimed, untraced call before every call (traced one included) that rebuilds
+    the state a mutating case starts from, its result is passed to function
+
+    returns (seconds, peakMB, result of last timed call)
+    """
+
+    best, result = np.inf, None
+    for _ in range(repeat):
+        args = () if setup is None else (setup(),)
+        t0 = time.perf_counter()
+        result = function(*args)
+        best = min(best, time.perf_counter()-t0)
+
+    args = () if setup is None else (setup(),)
+    tracemalloc.start()
+    try:
+        function(*args)
+        peak = tracemalloc.get_traced_memory()[1]/2**20
+    finally:
+        tracemalloc.stop()
+    return best, peak, result
+
+def runCases(n, folder, repeat=1, cases=None):
+    """
+    time the hot paths on synthetic data of n rows (events, stress nodes, triangles)
+
+    returns list of {'case', 'n', 'seconds', 'peakMB'}
+    """
+
+    from xyzData import xyzData
+    from gridData import gridData
+    from stlGeom import stlGeom
+    from stressUtils import unpackStress, getPrincipalStress
+
+    catalogue = syntheticCatalogue(os.path.join(folder, f'catalogue_{n}.csv'), n)
+    stress = syntheticStress(os.path.join(folder, f'stress_{n}.csv'), n)
+    os.makedirs(os.path.join(folder, f'mesh_{n}'), exist_ok=True)
+    syntheticMesh(os.path.join(folder, f'mesh_{n}', 'mine.stl'), n)
+
+    results = []
+    def case(name, function, setup=None):
+        if cases and name not in cases:
+            return None
+        seconds, peakMB, result = measure(function, repeat, setup)
+        results.append({'case': name, 'n': n, 'seconds': seconds, 'peakMB': peakMB})
+        print(f"{name:20s} n={n:<10d} {seconds:10.4f} s {peakMB:10.1f} MB")
+        return result
+
+    x = case('xyzData.read', lambda: xyzData(catalogue))
+    s = case('xyzData.read stress', lambda: xyzData(stress))
+    x = x or xyzData(catalogue)
+    s = s or xyzData(stress)
+    bBox = ((2700,4600,1000),(2900,4800,1200))
+
+    def reset():
+        x.current, x.rows, x.filters = x.pData, np.arange(len(x.pData)), []
+
+    def filters(_):
+        x.filterNaN('local magnitude')
+        x.filterIPR(1.0)
+        x.filterBBox(bBox, 50.)
+        return x.current
+    case('filters', filters, reset)
+    reset()
+
+    def mapping():
+        y = xyzData()
+        y.pData, y.current, y.index, y.maxCol = x.current, x.current, dict(x.index), x.maxCol
+        y.mapData(s)
+        return y
+    case('mapData', mapping)
+
+    g = case('gridData', lambda: gridData(x))
+    g = g or gridData(x)
+    case('cellCount', lambda: g.cellCount())
+    case('fillGrid', lambda grid: grid.fillGrid(), lambda: gridData(x)) # fills the grid in place
+
+    def eigens():
+        e = []
+        for s_vec in s.extractStress(indices='xyz'):
+            e_val, e_vec = getPrincipalStress(unpackStress(s_vec))
+            e.append(e_val[0])
+        return e
+    case('stress eigen', eigens)
+
+    case('stlGeom.readPath', lambda: stlGeom().readPath(os.path.join(folder, f'mesh_{n}'), combine=True))
+
+    return results
+
+def importTime(statement, cwd, repeat=3):
+    """
+    best time of statement in a fresh interpreter and the heavy modules it loaded
+
+    returns (seconds, [modules])
+    """
+
+    code = 'import sys,time; t0=time.perf_counter(); ' + statement + '; t=time.perf_counter()-t0; ' + \
+           'print(t, *[m for m in ("scipy.spatial","matplotlib","stl") if m in sys.modules])'
+    best, modules = np.inf, []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, cwd=cwd, \
+                             env=dict(os.environ, MPLBACKEND='Agg'))
+        if out.returncode:
+            raise RuntimeError(out.stderr)
+        seconds, *modules = out.stdout.split()
+        best = min(best, float(seconds))
+    return best, modules
+
+def runImports(repeat=3):
+    """
+    import time of the modules and the package (n=0 in the results)
+
+    returns list of {'case', 'n', 'seconds', 'peakMB', 'modules'}
+    """
+
+    folder = os.path.dirname(os.path.abspath(__file__))
+    statements = [('import xyzData', folder), ('import gridData', folder), ('import stressUtils', folder), \
+                  ('import stlGeom', folder), ('import plot3D', folder), \
+                  (f'import {os.path.basename(folder)}', os.path.dirname(folder))]
+
+    results = []
+    for statement, cwd in statements:
+        seconds, modules = importTime(statement, cwd, repeat)
+        results.append({'case': statement, 'n': 0, 'seconds': seconds, 'peakMB': None, 'modules': modules})
+        print(f"{statement:30s} {seconds:10.4f} s  {' '.join(modules)}")
+    return results
+
+# ---------------------------------------------------------------------------
+# history
+# ---------------------------------------------------------------------------
+
+def version():
+    """
+    git commit of the geotechTools folder, None if not a git repository
+    """
+
+    try:
+        return subprocess.run(['git','describe','--always','--dirty'], capture_output=True, text=True, \
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def readHistory(fileName):
+    """
+    list of benchmark runs from JSON history file
+    """
+
+    if not os.path.exists(fileName):
+        return []
+    with open(fileName) as f:
+        return json.load(f)
+
+def runBenchmarks(sizes=(10**3, 10**4), history='benchmark.json', repeat=1, cases=None, keep=False):
+    """
+    run all cases for each size and append the run to the JSON history
+    """
+
+    folder = tempfile.mkdtemp(prefix='geotechTools_benchmark_')
+    try:
+        results = []
+        if cases is None or 'import' in cases:
+            results += runImports(max(repeat,3))
+        for n in sizes:
+            results += runCases(int(n), folder, repeat, cases)
+    finally:
+        if keep:
+            print(f"synthetic data kept in {folder}")
+        else:
+            shutil.rmtree(folder, ignore_errors=True)
+
+    run = {'version': version(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S'), \
+           'python': platform.python_version(), 'numpy': np.__version__, \
+           'platform': platform.platform(), 'cpus': os.cpu_count(), 'results': results}
+
+    if history:
+        runs = readHistory(history)
+        runs.append(run)
+        with open(history, 'w') as f:
+            json.dump(runs, f, indent=1)
+
+    return run
+
+def compare(history='benchmark.json', a=-2, b=-1):
+    """
+    print time and memory ratios of run b over run a for each case and size
+    """
+
+    runs = readHistory(history)
+    ra, rb = runs[a], runs[b]
+    base = {(r['case'], r['n']): r for r in ra['results']}
+
+    print(f"{ra['version']} ({ra['time']}) -> {rb['version']} ({rb['time']})")
+    for r in rb['results']:
+        if (r['case'], r['n']) in base:
+            r0 = base[(r['case'], r['n'])]
+            memory = f" memory x{r['peakMB']/max(r0['peakMB'],1e-9):6.2f}" if r['peakMB'] else ''
+            print(f"{r['case']:20s} n={r['n']:<10d} time x{r['seconds']/max(r0['seconds'],1e-9):6.2f}" + memory)
+
+# ---------------------------------------------------------------------------
+# main
+# ---------------------------------------------------------------------------
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='geotechTools benchmarks')
+    parser.add_argument('--sizes', nargs='+', type=float, default=[1e3, 1e4], help='rows per dataset')
+    parser.add_argument('--history', default='benchmark.json', help='JSON history file')
+    parser.add_argument('--repeat', type=int, default=1, help='best of repeat runs')
+    parser.add_argument('--cases', nargs='+', default=None, help='run selected cases only')
+    parser.add_argument('--keep', action='store_true', help='keep synthetic data')
+    parser.add_argument('--compare', nargs=2, type=int, default=None, help='compare runs a b of history')
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    if args.compare:
+        compare(args.history, *args.compare)
+    else:
+        runBenchmarks([int(n) for n in args.sizes], args.history, args.repeat, args.cases, args.keep)
@@ -2,8 +2,333 @@
 config.py
 """
 
+import os
+import sys
+import json
+import time
+import importlib
+import threading
+import functools
+import tracemalloc
+
 # ---------------------------------------------------------------------------
 # global settings
 # ---------------------------------------------------------------------------
 
 verbose = False
+profile = False       # collect timed spans and counters in the registry below
+profileMemory = False # sample peak traced memory per span (tracemalloc, slow)
+cacheDir = None       # directory for memoized results (see cached()), None: off
+cacheMaxMB = 4096     # size cap of cacheDir, least recently used results are evicted
+precision = 'float64' # attribute and stress arrays, 'float32' halves their memory (see floatType())
+
+# ---------------------------------------------------------------------------
+# precision policy
+# ---------------------------------------------------------------------------
+
+def floatType():
+    """
+    numpy dtype of bulk attribute and stress arrays for config.precision: extractStress(),
+    principalAxes(), stressInvariants() and attribute columns written by xyzData.write()
+
+    - x,y,z coordinates (and xyzData.pData, which holds them) are always float64
+    - float32 stress analysis (orientationUtils.principalAxes(), stressUtils.stressInvariants())
+      is accurate to about eps |S|, eps = 1.2e-7 and |S| the largest principal stress magnitude
+    """
+
+    import numpy as np
+
+    if precision not in ['float64','float32']:
+        print (f"Error: config.precision '{precision}' not in 'float64', 'float32'")
+        raise TypeError
+    return np.dtype(precision)
+
+# ---------------------------------------------------------------------------
+# lazy imports of heavy dependencies
+# ---------------------------------------------------------------------------
+
+class lazyImport:
+    """
+    module imported on first attribute access, e.g. plt = config.lazyImport('matplotlib.pyplot')
+
+    keeps 'import xyzData' free of scipy, matplotlib and numpy-stl until they are used
+    """
+
+    def __init__(self, name):
+        self.__dict__['name'] = name
+        self.__dict__['module'] = sys.modules.get(name)
+
+    def __getattr__(self, attr):
+        module = self.__dict__['module']
+        if module is None:
+            module = self.__dict__['module'] = importlib.import_module(self.__dict__['name'])
+        return getattr(module, attr)
+
+    def __repr__(self):
+        return f"lazyImport('{self.__dict__['name']}')"
+
+# ---------------------------------------------------------------------------
+# instrumentation registry
+# ---------------------------------------------------------------------------
+
+spans = []    # finished spans [{'name','start','duration','peakMB','thread','depth','args'}]
+counters = {} # {name: value}
+
+epoch = time.perf_counter()
+local = threading.local() # open spans per thread
+
+class span:
+    """
+    timed span, as context manager or decorator
+
+    with config.span('xyzData.read', fileName=fileName): ...
+
+    - recorded in config.spans if config.profile, printed if config.verbose
+    - a single flag check when both are off
+    """
+
+    def __init__(self, name, **args):
+        self.name = name
+        self.args = args
+        self.active = False
+
+    def __enter__(self):
+        self.active = profile or verbose
+        if not self.active:
+            return self
+
+        stack = local.__dict__.setdefault('stack', [])
+        self.depth = len(stack)
+        self.peak = None
+        if profileMemory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            current, peak = tracemalloc.get_traced_memory()
+            if stack and stack[-1].peak is not None:
+                stack[-1].peak = max(stack[-1].peak, peak)
+            tracemalloc.reset_peak()
+            self.peak = current
+        stack.append(self)
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if not self.active:
+            return False
+
+        duration = time.perf_counter() - self.t0
+        stack = local.stack
+        stack.pop()
+        if self.peak is not None and tracemalloc.is_tracing():
+            self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            if stack and stack[-1].peak is not None:
+                stack[-1].peak = max(stack[-1].peak, self.peak)
+
+        if profile:
+            spans.append({'name': self.name, 'start': self.t0-epoch, 'duration': duration, \
+                          'peakMB': None if self.peak is None else self.peak/2**20, \
+                          'thread': threading.get_ident(), 'depth': self.depth, 'args': self.args})
+        if verbose:
+            print (f"{self.name} time: {duration} seconds")
+        return False
+
+    def __call__(self, function):
+        name = self.name
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not (profile or verbose):
+                return function(*args, **kwargs)
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+
+def timed(name=None):
+    """
+    decorator for a timed span named name (default: qualified function name)
+    """
+
+    def decorator(function):
+        return span(name or function.__qualname__)(function)
+    return decorator
+
+def count(name, n=1):
+    """
+    add n to counter name if config.profile
+    """
+
+    if profile:
+        counters[name] = counters.get(name, 0) + n
+
+def reset():
+    """
+    clear recorded spans and counters
+    """
+
+    spans.clear()
+    counters.clear()
+
+def query(name=None, minDuration=0.0):
+    """
+    recorded spans with name (prefix match, e.g. 'xyzData.') and duration >= minDuration
+    """
+
+    return [s for s in spans if (name is None or s['name'].startswith(name)) and s['duration']>=minDuration]
+
+def summary():
+    """
+    per span name {'calls', 'total', 'mean', 'max', 'peakMB'}, sorted by total time
+    """
+
+    table = {}
+    for s in spans:
+        t = table.setdefault(s['name'], {'calls': 0, 'total': 0.0, 'max': 0.0, 'peakMB': None})
+        t['calls'] += 1
+        t['total'] += s['duration']
+        t['max'] = max(t['max'], s['duration'])
+        if s['peakMB'] is not None:
+            t['peakMB'] = max(t['peakMB'] or 0.0, s['peakMB'])
+    for t in table.values():
+        t['mean'] = t['total']/t['calls']
+
+    return dict(sorted(table.items(), key=lambda item: -item[1]['total']))
+
+def exportJSON(fileName):
+    """
+    write spans, counters and summary to JSON file
+    """
+
+    with open(fileName, 'w') as f:
+        json.dump({'spans': spans, 'counters': counters, 'summary': summary()}, f, indent=1, default=str)
+
+def exportChromeTrace(fileName):
+    """
+    write spans and counters in Chrome trace event format (chrome://tracing, Perfetto)
+    """
+
+    pid = os.getpid()
+    events = [{'name': s['name'], 'ph': 'X', 'ts': s['start']*1e6, 'dur': s['duration']*1e6, \
+               'pid': pid, 'tid': s['thread'], \
+               'args': dict(s['args'], **({'peakMB': s['peakMB']} if s['peakMB'] is not None else {}))} \
+              for s in spans]
+    end = max([s['start']+s['duration'] for s in spans], default=0.0)
+    events += [{'name': name, 'ph': 'C', 'ts': end*1e6, 'pid': pid, 'args': {name: value}} \
+               for name, value in counters.items()]
+
+    with open(fileName, 'w') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f, default=str)
+
+def importOptional(name, package=None):
+    """
+    import optional dependency name, e.g. config.importOptional('pyarrow.parquet', 'pyarrow')
+
+    prints the pip install command if the package is missing
+    """
+
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        print (f"Error: {name} requires {package or name}, a non-standard package: pip install {package or name}")
+        raise
+
+# ---------------------------------------------------------------------------
+# memoization of derived results on disk
+# ---------------------------------------------------------------------------
+
+def hashKey(*parts):
+    """
+    hex digest of parts: np.ndarray by dtype, shape and buffer, anything else by repr()
+
+    xxhash (xxh3_128) if installed, else blake2b
+    """
+
+    import numpy as np
+
+    try:
+        import xxhash
+        h = xxhash.xxh3_128()
+    except ImportError:
+        import hashlib
+        h = hashlib.blake2b(digest_size=16)
+
+    for part in parts:
+        if isinstance(part, np.ndarray):
+            part = np.ascontiguousarray(part)
+            h.update(f"ndarray {part.dtype.str} {part.shape}".encode())
+            h.update(memoryview(part).cast('B'))
+        else:
+            h.update(repr(part).encode())
+    return h.hexdigest()
+
+def cached(name, parts, compute):
+    """
+    result of compute() memoized in cacheDir under name and hashKey(*parts)
+
+    e.g. config.cached('principalAxes', [stress], lambda: np.linalg.eigh(T))
+
+    - compute() runs directly if cacheDir is None
+    - results are pickled, a hit refreshes the file time for least recently used eviction
+    """
+
+    if cacheDir is None:
+        return compute()
+
+    import pickle
+
+    with span('config.cached hash', cache=name):
+        key = hashKey(*parts)
+    fileName = os.path.join(cacheDir, f"{name}-{key}.pkl")
+
+    try:
+        with open(fileName, 'rb') as f:
+            result = pickle.load(f)
+        os.utime(fileName)
+        count('config.cache hits')
+        return result
+    except (OSError, EOFError, pickle.UnpicklingError):
+        pass
+
+    result = compute()
+    count('config.cache misses')
+
+    os.makedirs(cacheDir, exist_ok=True)
+    temp = f"{fileName}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp, 'wb') as f:
+        pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp, fileName) # atomic for concurrent writers
+    evict()
+
+    return result
+
+def evict(maxMB=None):
+    """
+    delete least recently used results in cacheDir until it is below maxMB (default cacheMaxMB)
+    """
+
+    if cacheDir is None or not os.path.isdir(cacheDir):
+        return
+    maxBytes = (cacheMaxMB if maxMB is None else maxMB) * 2**20
+
+    files = []
+    for entry in os.scandir(cacheDir):
+        if entry.name.endswith(('.pkl', '.npz')): # cached() results, stlIndex files
+            stat = entry.stat()
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in files)
+
+    for _, size, path in sorted(files):
+        if total <= maxBytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+            count('config.cache evictions')
+        except OSError:
+            pass
+
+def clearCache():
+    """
+    delete all results in cacheDir
+    """
+
+    evict(0)
@@ -19,11 +19,9 @@ If not, see <https://www.gnu.org/licenses/>.
 # imports
 # ---------------------------------------------------------------------------
 
-from re import S
 import numpy as np
-from scipy.spatial import KDTree
 
-from xyzData import *
+from xyzData import xyzData, array3D_BBox, planePoints, linePoints, boxPoints
 import config
 
 # ---------------------------------------------------------------------------
@@ -32,6 +30,7 @@ import config
 
 class gridData:
 
+	@config.timed('gridData')
 	def __init__(self, data, cellSize=None, sparse=True, bBox=None):
 		"""
 		constructor for gridData()
@@ -44,6 +43,7 @@ class gridData:
 		self.order = 2.0            # target points per cell for auto == order^3
 									# examples 2:8, 2.75:20.8, 3.7:50
 		self.data = data            # np.ndarray, 
+		self.counts = None          # dense np.array() of shape (nx,ny,nz) with points per cell, see sample()
 
 		# source data - columns 0,1,2 must be x,y,z
 		# -----------------------------------------
@@ -90,17 +90,15 @@ class gridData:
 		if not(self.sparse):
 			self.cells = {(i,j,k): [] for i in range(nx) for j in range(ny) for k in range(nz)}
 
-		# assign data
-		# -----------
-		for r in range(len(self.data)):
-			x,y,z = self.data[r][0], self.data[r][1], self.data[r][2]
-			i = int((x-self.bBox[0][0])/self.cellSize)
-			j = int((y-self.bBox[0][1])/self.cellSize)
-			k = int((z-self.bBox[0][2])/self.cellSize)
-			if (i,j,k) in self.cells:
-				self.cells[(i,j,k)].append(self.data[r])
-			else:
-				self.cells[(i,j,k)]=[self.data[r],]
+		# assign data, rows per cell memoized if config.cacheDir is set
+		# -------------------------------------------------------------
+		cellKeys, cellRows = config.cached('gridData', \
+			[self.data[:,0:3], self.cellSize, tuple(map(tuple, self.bBox))], self.cellRows)
+		for ijk, rows in zip(cellKeys, cellRows):
+			self.cells[ijk] = list(self.data[rows])
+
+		config.count('gridData.points gridded', len(self.data))
+		config.count('gridData.cells created', len(self.cells))
 
 		if config.verbose:
 			print(self)
@@ -117,6 +115,32 @@ class gridData:
 
 	# ~def __init__(self, data: np.ndarray, cellSize=None, sparse=True)
 
+	def cellRows(self):
+		"""
+		method to group data rows by cell (i,j,k), cells in order of their first row
+
+		returns list of (i,j,k) and list of row index np.array()
+		"""
+
+		if len(self.data)==0:
+			return [], []
+
+		ijk = np.trunc((self.data[:,0:3] - np.array(self.bBox[0]))/self.cellSize).astype(np.int64) # as int()
+		lo = ijk.min(axis=0)
+		dims = ijk.max(axis=0) - lo + 1
+		flat = ((ijk[:,0]-lo[0])*dims[1] + (ijk[:,1]-lo[1]))*dims[2] + (ijk[:,2]-lo[2])
+
+		order = np.argsort(flat, kind='stable')
+		first = np.flatnonzero(np.diff(flat[order], prepend=-1) != 0)
+		rows = np.split(order, first[1:])
+		byFirst = np.argsort(order[first])
+
+		keys = ijk[order[first]][byFirst].tolist()
+		return [tuple(key) for key in keys], [rows[c] for c in byFirst]
+
+	# ~def cellRows()
+
+	@config.timed('gridData.cellCount')
 	def cellCount(self, minN=0):
 		"""
 		method to reverse ijk to np.array() of shape (N, 4)
@@ -139,6 +163,87 @@ class gridData:
 
 	# ~def cellCount()
 
+	def cellCentres(self, ijk):
+		"""
+		method to convert cell indices np.array() of shape (N, 3) to cell centres x,y,z
+
+		gridData(g.cellCentres(np.argwhere(voxels)), g.cellSize, bBox=g.bBox)
+		rebuilds a grid on the same lattice, e.g. from stlGeom.voxelize()
+		"""
+
+		ijk = np.asarray(ijk).reshape(-1,3)
+		return (ijk+0.5)*self.cellSize + np.array(self.bBox[0])
+
+	# ~def cellCentres()
+
+	def cellIndex(self, points):
+		"""
+		method to return flat cell index into self.shape for points of shape (..., 3 or more),
+		-1 outside the grid
+		"""
+
+		points = np.asarray(points, dtype=np.float64)
+		ijk = np.floor((points[...,0:3] - np.array(self.bBox[0]))/self.cellSize).astype(np.int64)
+		inside = np.all((ijk >= 0) & (ijk < np.array(self.shape)), axis=-1)
+		ijk[~inside] = 0
+
+		return np.where(inside, np.ravel_multi_index(np.moveaxis(ijk,-1,0), self.shape), -1)
+
+	# ~def cellIndex()
+
+	@config.timed('gridData.sample')
+	def sample(self, points, fill=0):
+		"""
+		method to sample number of points per cell at points of shape (..., 3)
+
+		points outside the grid return fill
+
+		returns np.array() of shape (...)
+		"""
+
+		if self.counts is None:
+			self.counts = np.zeros(self.shape)
+			for ijk, cell in self.cells.items():
+				self.counts[ijk] = len(cell)
+
+		cell = self.cellIndex(points)
+		config.count('gridData.points sampled', cell.size)
+
+		return np.where(cell >= 0, self.counts.ravel()[np.maximum(cell,0)], fill)
+
+	# ~def sample()
+
+	def sampleSection(self, centre, dip, ddir, width, height, resolution, **kwargs):
+		"""
+		method to sample a plane section, see planePoints() and sample()
+
+		returns u (nu,), v (nv,), points (nv, nu, 3) and values (nv, nu)
+		"""
+
+		u, v, points = planePoints(centre, dip, ddir, width, height, resolution)
+		return u, v, points, self.sample(points, **kwargs)
+
+	def sampleLine(self, polyline, resolution, **kwargs):
+		"""
+		method to sample along a polyline, see linePoints() and sample()
+
+		returns chainage (N,), points (N, 3) and values (N,)
+		"""
+
+		chainage, points = linePoints(polyline, resolution)
+		return chainage, points, self.sample(points, **kwargs)
+
+	def sampleBox(self, bBox, resolution, **kwargs):
+		"""
+		method to sample a regular box, see boxPoints() and sample()
+
+		returns points (nx, ny, nz, 3) and values (nx, ny, nz)
+		"""
+
+		points = boxPoints(bBox, resolution)
+		return points, self.sample(points, **kwargs)
+
+	@config.timed('gridData.fillGrid')
 	def fillGrid(self):
 		"""
 		method to fill sparse grid with empty cells
@@ -0,0 +1,267 @@
+"""
+octreeData.py - Copyright 2024 S.M.Arndt, Cavroc Pty Ltd
+Visit https://cavroc.com/ for more information on IUCM and StopeX
+
+This file is part of geotechTools (https://github.com/SMArndt/geotechTools).
+
+geotechTools is free software: you can redistribute it and/or modify it under the
+terms of the GNU General Public License as published by the Free Software Foundation.
+
+geotechTools is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with geotechTools.
+If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# ---------------------------------------------------------------------------
+# notes
+# ---------------------------------------------------------------------------
+# - adaptive alternative to gridData: cells are split until they hold at most order^3
+#   points, so memory and queries follow the data rather than the bounding box volume
+# - points are sorted once by Morton key at the finest level (maxDepth), every octree
+#   cell is then a contiguous range of the sorted points and splitting a level is a
+#   vectorized pass over the points of the cells that are split
+# - only non-empty leaves are stored
+
+# ---------------------------------------------------------------------------
+# imports
+# ---------------------------------------------------------------------------
+
+import numpy as np
+
+from xyzData import xyzData, array3D_BBox
+from stlGeom import mortonKey, mortonIJK
+import config
+
+# ---------------------------------------------------------------------------
+# functions
+# ---------------------------------------------------------------------------
+
+def radixArgsort(keys, bits=63):
+    """
+    stable argsort of non-negative int64 keys < 2^bits, LSD radix sort on 16 bit digits
+    """
+
+    order = np.arange(len(keys))
+    for shift in range(0, bits, 16):
+        digit = ((keys[order] >> shift) & 0xFFFF).astype(np.uint16)
+        order = order[np.argsort(digit, kind='stable')] # radix sort for 16 bit
+    return order
+
+# ---------------------------------------------------------------------------
+# class octreeData()
+# ---------------------------------------------------------------------------
+
+class octreeData:
+
+    @config.timed('octreeData')
+    def __init__(self, data, order=2.0, maxDepth=16, bBox=None):
+        """
+        constructor for octreeData()
+
+        data: np.ndarray of shape (N, 3 or more) or xyzData, columns 0,1,2 must be x,y,z
+        order: target points per leaf order^3, as gridData.order
+        maxDepth: maximum number of splits of the root cube (up to 21)
+        """
+
+        self.order = order
+        self.maxDepth = min(int(maxDepth), 21)
+
+        # source data - columns 0,1,2 must be x,y,z
+        # -----------------------------------------
+        if isinstance(data,np.ndarray):
+            self.data = data
+            self.index = False
+        elif isinstance(data,xyzData):
+            self.data = data.current
+            self.index = data.index
+        else:
+            print ('Error: requires np.ndarray or xyzData')
+            raise TypeError
+        if (self.data.ndim!=2) or (self.data.shape[1]<3):
+            print ('Error: requires ndim==2 and shape(N, 3 or more')
+            raise TypeError
+
+        # root cube on the bounding box
+        # -----------------------------
+        self.bBox = array3D_BBox(self.data) if bBox is None else bBox
+        self.origin = np.array(self.bBox[0], dtype=np.float64)
+        extent = np.array(self.bBox[1], dtype=np.float64) - self.origin
+        self.size = max(extent.max(), 1e-9) * (1 + 1e-9) # root cube edge length
+
+        # Morton keys at the finest level, points sorted by key
+        # -----------------------------------------------------
+        D = self.maxDepth
+        self.keys = self.pointKeys(self.data)
+        with config.span('octreeData radixArgsort'):
+            self.sorted = radixArgsort(self.keys, 3*D)
+        self.keys = self.keys[self.sorted]
+
+        # split level by level
+        # --------------------
+        target = self.order**3
+        start, count = np.array([0]), np.array([len(self.data)])
+        code = np.array([0], dtype=np.int64)
+        leaves = [] # (level, code, start, count) per level
+
+        for level in range(D+1):
+            split = (count > target) & (level < D)
+            leaves.append((np.full((~split).sum(), level), code[~split], start[~split], count[~split]))
+            if not split.any():
+                break
+
+            # child codes of all points in split cells, sorted like the points
+            s, n = start[split], count[split]
+            points = np.repeat(s - np.cumsum(n) + n, n) + np.arange(n.sum())
+            child = self.keys[points] >> 3*(D-level-1)
+
+            first = np.flatnonzero(np.diff(child, prepend=-1) != 0)
+            code = child[first]
+            start = points[first]
+            count = np.diff(np.append(first, len(points)))
+
+        self.level = np.concatenate([l[0] for l in leaves]).astype(np.int8)
+        self.code = np.concatenate([l[1] for l in leaves])
+        self.start = np.concatenate([l[2] for l in leaves])
+        self.count = np.concatenate([l[3] for l in leaves])
+
+        # leaves in key order for point location
+        order = np.argsort(self.start, kind='stable')
+        self.level, self.code, self.start, self.count = \
+            self.level[order], self.code[order], self.start[order], self.count[order]
+        self.first = self.code << 3*(D-self.level.astype(np.int64)) # first finest key of leaf
+        self.last = (self.code+1) << 3*(D-self.level.astype(np.int64))
+
+        config.count('octreeData.points', len(self.data))
+        config.count('octreeData.leaves', len(self.code))
+
+        if config.verbose:
+            print(self)
+
+    # ~def __init__(self, data, order=2.0, maxDepth=16)
+
+    def __str__(self):
+        return f"octreeData object of {self.data.shape} with {len(self.code)} leaves, " + \
+               f"levels {self.level.min()}-{self.level.max()}, root size {self.size}"
+
+    def pointKeys(self, points):
+        """
+        method to return finest level Morton keys of points of shape (N, 3 or more),
+        -1 outside the root cube
+        """
+
+        n = 2**self.maxDepth
+        q = np.floor((np.asarray(points)[:,0:3] - self.origin)/self.size * n).astype(np.int64)
+        inside = np.all((q >= 0) & (q < n), axis=1)
+        keys = mortonKey(np.where(inside[:,None], q, 0), self.maxDepth)
+        keys[~inside] = -1
+        return keys
+
+    # ~def pointKeys()
+
+    def cellIndex(self, points):
+        """
+        method to return leaf index for points of shape (N, 3 or more), -1 outside all leaves
+        """
+
+        keys = self.pointKeys(points)
+        leaf = np.maximum(np.searchsorted(self.first, keys, side='right') - 1, 0)
+        return np.where((keys >= 0) & (keys < self.last[leaf]) & (keys >= self.first[leaf]), leaf, -1)
+
+    # ~def cellIndex()
+
+    def cellSize(self):
+        """
+        method to return edge length of each leaf
+        """
+
+        return self.size / 2.0**self.level
+
+    def cellCentres(self):
+        """
+        method to return leaf centres np.array() of shape (N, 3)
+        """
+
+        size = self.cellSize()
+        ijk = mortonIJK(self.code, self.maxDepth)
+        return self.origin + (ijk + 0.5)*size[:,None]
+
+    def cellCount(self, minN=0):
+        """
+        method to return np.array() of shape (N, 4) with [,0],[,1],[,2] = x,y,z leaf centres
+        and [,3] = number of points in leaf, as gridData.cellCount()
+        """
+
+        a = np.column_stack([self.cellCentres(), self.count])
+        return a[a[:,3] > minN]
+
+    # ~def cellCount()
+
+    def sample(self, points, fill=0):
+        """
+        method to sample number of points per leaf at points of shape (..., 3), fill outside
+        """
+
+        points = np.asarray(points, dtype=np.float64)
+        leaf = self.cellIndex(points.reshape(-1, points.shape[-1]))
+        return np.where(leaf >= 0, self.count[np.maximum(leaf,0)], fill).reshape(points.shape[:-1])
+
+    # ~def sample()
+
+    def aggregate(self, col, how='mean'):
+        """
+        method to aggregate column col (index or name of xyzData index) per leaf
+
+        how: 'mean', 'sum', 'min', 'max' (nan ignored)
+        """
+
+        if isinstance(col,str):
+            col = self.index[col]
+
+        values = self.data[self.sorted, col]
+        leaf = np.repeat(np.arange(len(self.code)), self.count)
+        finite = np.isfinite(values)
+
+        if how in ['mean','sum']:
+            total = np.bincount(leaf[finite], weights=values[finite], minlength=len(self.code))
+            if how=='sum':
+                return total
+            n = np.bincount(leaf[finite], minlength=len(self.code))
+            with np.errstate(invalid='ignore', divide='ignore'):
+                return total/n
+        elif how in ['min','max']:
+            result = np.full(len(self.code), np.inf if how=='min' else -np.inf)
+            (np.minimum if how=='min' else np.maximum).at(result, leaf[finite], values[finite])
+            result[np.isinf(result)] = np.nan
+            return result
+        else:
+            print (f"Error: how '{how}' not in 'mean', 'sum', 'min', 'max'")
+            raise TypeError
+
+    # ~def aggregate()
+
+    def leafFaces(self, values=None, gap=0.1):
+        """
+        method to export leaf boxes for plotting, e.g. art3d.Poly3DCollection(verts)
+
+        values: per leaf (default points per leaf), gap: shrink factor of each box side
+
+        returns verts np.array() of shape (6N, 4, 3) and face values (6N,)
+        """
+
+        from plot3D import plot3DVoxel
+
+        values = self.count if values is None else np.asarray(values)
+        size = self.cellSize()
+        corner = self.cellCentres() - size[:,None]/2
+
+        verts = []
+        for axis, side, corners in plot3DVoxel.faces:
+            corners = gap + np.array(corners)*(1-2*gap)
+            verts.append(corner[:,None,:] + corners[None,:,:]*size[:,None,None])
+
+        return np.concatenate(verts), np.tile(values, 6)
+
+    # ~def leafFaces()
@@ -0,0 +1,262 @@
+"""
+orientationUtils.py - Copyright 2024 S.M.Arndt, Cavroc Pty Ltd
+Visit https://cavroc.com/ for more information on IUCM and StopeX
+
+This file is part of geotechTools (https://github.com/SMArndt/geotechTools).
+
+geotechTools is free software: you can redistribute it and/or modify it under the
+terms of the GNU General Public License as published by the Free Software Foundation.
+
+geotechTools is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with geotechTools.
+If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# ---------------------------------------------------------------------------
+# notes
+# ---------------------------------------------------------------------------
+# - bulk versions of getStressOrientation() and getPlaneOrientation(), z is up
+# - axes and poles are axial data (v == -v), stereonets are lower hemisphere equal area
+# - densities are multiples of a uniform distribution (MUD)
+# - principalAxes() runs in config.floatType(), with float32 (measured on 2M random tensors)
+#   eigenvalues are within 2 eps |S| and axes within 2 eps |S|/gap radians of float64,
+#   eps = 1.2e-7, |S| the largest principal stress magnitude, gap the distance to the
+#   nearest other eigenvalue, i.e. well below 0.01 degrees unless two principals are equal
+
+# ---------------------------------------------------------------------------
+# imports
+# ---------------------------------------------------------------------------
+
+import numpy as np
+
+import config
+
+# ---------------------------------------------------------------------------
+# conversions
+# ---------------------------------------------------------------------------
+
+def plungeTrendToVectors(plunge, trend):
+    """
+    downward unit vectors np.array() of shape (N, 3) for plunge and trend in degrees
+    """
+
+    p, t = np.radians(plunge), np.radians(trend)
+    return np.stack([np.cos(p)*np.sin(t), np.cos(p)*np.cos(t), -np.sin(p)], axis=-1)
+
+def vectorsToPlungeTrend(v):
+    """
+    plunge and trend in degrees of axes v of shape (N, 3), as getStressOrientation()
+    """
+
+    v = np.where(v[...,2:3] > 0, -v, v) # lower hemisphere
+    plunge = np.degrees(np.arctan2(-v[...,2], np.hypot(v[...,0], v[...,1]))) # exact near vertical
+    trend = np.degrees(np.arctan2(v[...,0], v[...,1])) % 360
+    return plunge, trend
+
+def dipDirToNormals(dip, ddir):
+    """
+    upward unit normals np.array() of shape (N, 3) for dip and direction in degrees,
+    bulk getPlaneNormal()
+    """
+
+    d, a = np.radians(dip), np.radians(ddir)
+    return np.stack([np.sin(d)*np.sin(a), np.sin(d)*np.cos(a), np.cos(d)], axis=-1)
+
+def normalsToDipDir(n):
+    """
+    dip and direction in degrees of plane normals n of shape (N, 3), as getPlaneOrientation()
+    """
+
+    plunge, trend = vectorsToPlungeTrend(n)
+    return 90.0 - plunge, (trend + 180) % 360
+
+@config.timed('orientationUtils.principalAxes')
+def principalAxes(stress):
+    """
+    principal stresses of packed stress np.array() of shape (N, 6) [Sxx,Syy,Szz,Sxy,Sxz,Syz],
+    bulk getPrincipalStress()
+
+    returns eigenvalues (N, 3) ascending and eigenvectors (N, 3, 3) in columns of
+    config.floatType(), memoized if config.cacheDir is set
+    """
+
+    s = np.asarray(stress, dtype=config.floatType())
+
+    def compute():
+        T = np.empty((len(s),3,3), dtype=s.dtype)
+        T[:,0,0], T[:,1,1], T[:,2,2] = s[:,0], s[:,1], s[:,2]
+        T[:,0,1] = T[:,1,0] = s[:,3]
+        T[:,0,2] = T[:,2,0] = s[:,4]
+        T[:,1,2] = T[:,2,1] = s[:,5]
+        return tuple(np.linalg.eigh(T))
+
+    return config.cached('principalAxes', [s], compute)
+
+# ---------------------------------------------------------------------------
+# density
+# ---------------------------------------------------------------------------
+
+def hemisphereGrid(resolution=101):
+    """
+    regular grid on the lower hemisphere equal area (Schmidt) net of unit radius
+
+    returns x, y (resolution, resolution) and unit vectors (resolution, resolution, 3),
+    nan outside the net
+    """
+
+    x, y = np.meshgrid(np.linspace(-1,1,resolution), np.linspace(-1,1,resolution))
+    r = np.hypot(x, y)
+    with np.errstate(invalid='ignore'):
+        theta = 2*np.arcsin(r/np.sqrt(2)) # angle from vertical
+        trend = np.arctan2(x, y)
+        v = np.stack([np.sin(theta)*np.sin(trend), np.sin(theta)*np.cos(trend), -np.cos(theta)], axis=-1)
+    v[r > 1] = np.nan
+
+    return x, y, v
+
+def projectVectors(v):
+    """
+    lower hemisphere equal area projection x, y of axes v of shape (N, 3)
+    """
+
+    plunge, trend = vectorsToPlungeTrend(v)
+    r = np.sqrt(2)*np.sin(np.radians(90-plunge)/2)
+    t = np.radians(trend)
+    return r*np.sin(t), r*np.cos(t)
+
+@config.timed('orientationUtils.orientationDensity')
+def orientationDensity(vectors, grid, method='fisher', sigma=3.0, kappa=None, weights=None, chunk=2**22):
+    """
+    axial density of vectors (N, 3) at grid unit vectors (..., 3), e.g. hemisphereGrid()
+
+    - method 'kamb': counts in a cone with expected count sigma^2 for uniform data
+    - method 'fisher': exponential (Fisher) kernel exp(kappa (|cos| - 1)),
+      default kappa = 2 (1 + N/sigma^2) as for the Kamb cone (Vollmer 1995)
+    narrow kernels (cone or kernel truncated at exp(-20) under a tenth of the sphere) sum
+    grid - vector pairs found with a KDTree, else grid and vectors are multiplied in
+    chunks of chunk products
+
+    returns density in multiples of uniform distribution, shape of grid[...,0]
+    """
+
+    v = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    w = np.ones(len(v)) if weights is None else np.asarray(weights, dtype=np.float64)
+    valid = np.all(np.isfinite(v), axis=1) & np.isfinite(w)
+    v, w = v[valid], w[valid]
+    N = w.sum()
+
+    shape = grid.shape[:-1]
+    g = grid.reshape(-1,3)
+    inside = np.all(np.isfinite(g), axis=1)
+    g = g[inside]
+
+    if method=='kamb':
+        cosLimit = 1.0 - sigma**2/(N + sigma**2)
+        expected = N*(1.0 - cosLimit)
+    elif method=='fisher':
+        kappa = 2*(1 + N/sigma**2) if kappa is None else kappa
+        expected = N*(1.0 - np.exp(-kappa))/kappa
+    else:
+        print (f"Error: method '{method}' not in 'kamb', 'fisher'")
+        raise TypeError
+
+    def kernel(cos):
+        if method=='kamb':
+            return (cos >= cosLimit).astype(np.float64)
+        return np.exp(kappa*(cos - 1.0))
+
+    density = np.zeros(len(g))
+    cap = (1.0 - cosLimit) if method=='kamb' else min(20.0/kappa, 1.0) # 1-cos of kernel support
+
+    if cap < 0.1:
+        from scipy.spatial import cKDTree
+
+        gridTree = cKDTree(g)
+        radius = np.sqrt(2*cap) # chord
+        step = max(1, int(chunk/(len(g)*cap + 1)))
+        for c in range(0, len(v), step):
+            axes = np.vstack([v[c:c+step], -v[c:c+step]])
+            pairs = gridTree.sparse_distance_matrix(cKDTree(axes), radius, output_type='ndarray')
+            j = pairs['j'] % len(v[c:c+step])
+            density += np.bincount(pairs['i'], weights=kernel(1.0 - pairs['v']**2/2)*w[c:c+step][j], \
+                                   minlength=len(g))
+            config.count('orientationUtils.kernel pairs', len(pairs))
+    else:
+        step = max(1, chunk//max(len(g),1))
+        for c in range(0, len(v), step):
+            density += kernel(np.abs(g @ v[c:c+step].T)) @ w[c:c+step]
+        config.count('orientationUtils.kernel products', len(g)*len(v))
+
+    result = np.full(inside.shape, np.nan)
+    result[inside] = density/expected if N > 0 else 0.0
+    return result.reshape(shape)
+
+# ~def orientationDensity()
+
+# ---------------------------------------------------------------------------
+# statistics per group
+# ---------------------------------------------------------------------------
+
+@config.timed('orientationUtils.groupOrientation')
+def groupOrientation(vectors, groups=None, nGroups=None):
+    """
+    mean orientation of axes vectors (N, 3) per group (N,) int, -1 to skip (default one group)
+
+    - orientation tensor T = sum(v v') / n per group, mean axis is its major eigenvector
+    - axes flipped onto the mean axis, R = |sum(v)|, Fisher kappa = (n-1)/(n-R)
+
+    returns dict of np.array(): n, mean (G, 3), plunge, trend, R (mean resultant length),
+    kappa, eigenvalues (G, 3) of T ascending
+    """
+
+    v = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    groups = np.zeros(len(v), dtype=np.int64) if groups is None else np.asarray(groups, dtype=np.int64)
+    nGroups = int(groups.max())+1 if nGroups is None else nGroups
+    use = (groups >= 0) & np.all(np.isfinite(v), axis=1)
+    v, g = v[use], groups[use]
+
+    n = np.bincount(g, minlength=nGroups).astype(np.float64)
+    T = np.zeros((nGroups,3,3))
+    for a in range(3):
+        for b in range(a,3):
+            T[:,a,b] = T[:,b,a] = np.bincount(g, weights=v[:,a]*v[:,b], minlength=nGroups)
+    with np.errstate(invalid='ignore'):
+        T /= n[:,None,None]
+    T[n==0] = 0.0
+
+    eigenvalues, eigenvectors = np.linalg.eigh(T)
+    axis = eigenvectors[:,:,2]
+
+    sign = np.sign(np.einsum('ij,ij->i', v, axis[g]))
+    sign[sign==0] = 1.0
+    resultant = np.stack([np.bincount(g, weights=sign*v[:,a], minlength=nGroups) for a in range(3)], axis=1)
+    length = np.linalg.norm(resultant, axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = resultant/length[:,None]
+        kappa = (n-1)/(n-length)
+        R = length/n
+    mean[n==0] = np.nan
+    kappa[n<2] = np.nan
+    plunge, trend = vectorsToPlungeTrend(mean)
+
+    config.count('orientationUtils.axes grouped', len(v))
+    return {'n': n, 'mean': mean, 'plunge': plunge, 'trend': trend, 'R': R, 'kappa': kappa, \
+            'eigenvalues': eigenvalues}
+
+# ~def groupOrientation()
+
+def gridOrientation(grid, points, vectors):
+    """
+    groupOrientation() per cell of gridData grid for axes vectors (N, 3) located at points (N, 3)
+
+    returns dict of dense np.array() of shape grid.shape (+ (3,) for mean and eigenvalues)
+    """
+
+    stats = groupOrientation(vectors, grid.cellIndex(points), int(np.prod(grid.shape)))
+    return {key: value.reshape(grid.shape + value.shape[1:]) for key, value in stats.items()}
+
+# ~def gridOrientation()
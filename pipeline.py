@@ -0,0 +1,445 @@
+"""
+pipeline.py - Copyright 2024 S.M.Arndt, Cavroc Pty Ltd
+Visit https://cavroc.com/ for more information on IUCM and StopeX
+
+This file is part of geotechTools (https://github.com/SMArndt/geotechTools).
+
+geotechTools is free software: you can redistribute it and/or modify it under the
+terms of the GNU General Public License as published by the Free Software Foundation.
+
+geotechTools is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with geotechTools.
+If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# ---------------------------------------------------------------------------
+# notes
+# ---------------------------------------------------------------------------
+# - a pipeline is a list of stages, each a dict {'stage': name, parameters...}, e.g.
+#
+#   p = pipeline([{'stage': 'read'},
+#                 {'stage': 'filterNaN', 'col': 'local magnitude'},
+#                 {'stage': 'mapData', 'source': 'stress'},
+#                 {'stage': 'principal'},
+#                 {'stage': 'write', 'fileName': 'out/{stem}.parquet'}],
+#                sources={'stress': xyzData('regular_stress.csv')})
+#   p.run(files=['a.csv', 'b.csv'], workers=4, memoryLimit=8*2**30)
+#
+# - jobs are input files or non-empty spatial tiles of one xyzData (run(data=..., tiles=...))
+# - xyzData sources and tiled data are passed to the worker processes once through
+#   shared memory, not pickled per job
+# - jobs are started while their estimated memory fits in memoryLimit
+# - a stage with an 'output' (and every 'write' stage) records the hash of the pipeline
+#   up to that stage, the digests of the tile rows and of shared sources next to its output;
+#   a job resumes after the last output that is newer than its inputs and has a matching hash
+#   (not after a write of selected columns or sorted rows, which is not the complete data)
+# - new stages: @pipeline.stage('name') def f(data, context, **parameters) -> xyzData
+
+# ---------------------------------------------------------------------------
+# imports
+# ---------------------------------------------------------------------------
+
+import os
+import json
+import time
+import hashlib
+import gc
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from xyzData import xyzData
+import config
+
+# ---------------------------------------------------------------------------
+# stages
+# ---------------------------------------------------------------------------
+
+stages = {} # {name: function(data, context, **parameters)}
+
+def stage(name):
+    """
+    decorator to register a pipeline stage function(data, context, **parameters)
+    returning the xyzData for the next stage (None: data was changed in place)
+    """
+
+    def decorator(function):
+        stages[name] = function
+        return function
+    return decorator
+
+@stage('read')
+def readStage(data, context, columns=None, bBox=None):
+    if data is not None: # tile jobs start with their data
+        return data
+    return xyzData(context['input'], columns=columns, bBox=bBox)
+
+@stage('filterIPR')
+def filterIPRStage(data, context, p_IPR=25.0):
+    data.filterIPR(p_IPR)
+
+@stage('filterNaN')
+def filterNaNStage(data, context, col):
+    data.filterNaN(col)
+
+@stage('filterBBox')
+def filterBBoxStage(data, context, bBox, offset=0.0):
+    data.filterBBox(bBox, offset)
+
+@stage('filterTime')
+def filterTimeStage(data, context, start=None, end=None):
+    data.filterTime(start, end)
+
+@stage('mapData')
+def mapDataStage(data, context, source, newIndex='mapData-1', overwrite=True, maxDist=False, \
+                 interpolate='nearest'):
+    data.mapData(getSource(source, context), newIndex, overwrite, maxDist, interpolate=interpolate)
+
+@stage('principal')
+def principalStage(data, context, indices='default'):
+    from orientationUtils import principalAxes, vectorsToPlungeTrend
+
+    values, vectors = principalAxes(data.extractStress(indices))
+    plunge, trend = vectorsToPlungeTrend(vectors[:,:,0])
+    data.addColumns({'sigma1': values[:,0], 'sigma2': values[:,1], 'sigma3': values[:,2], \
+                     'sigma1 plunge': plunge, 'sigma1 trend': trend})
+
+@stage('grid')
+def gridStage(data, context, cellSize=None, name='cell count'):
+    from gridData import gridData
+
+    g = gridData(data.current[:,0:3], cellSize)
+    data.addColumns({name: g.sample(data.current[:,0:3])})
+
+@stage('write')
+def writeStage(data, context, fileName, columns=None, sort=False):
+    data.write(formatPath(fileName, context), columns, sort=sort)
+
+@stage('call')
+def callStage(data, context, function, **parameters):
+    return function(data, **parameters)
+
+# ---------------------------------------------------------------------------
+# shared memory and sources
+# ---------------------------------------------------------------------------
+
+attached = {} # {shared memory name: SharedMemory} of this process
+sourceCache = {} # {shared memory name or (file name, mtime): xyzData} of this process
+
+def shareArray(a):
+    """
+    copy np.array() a into shared memory
+
+    returns SharedMemory (owner must close and unlink) and descriptor for attachArray()
+    """
+
+    a = np.ascontiguousarray(a)
+    shm = shared_memory.SharedMemory(create=True, size=max(a.nbytes,1))
+    np.ndarray(a.shape, a.dtype, buffer=shm.buf)[...] = a
+    return shm, (shm.name, a.shape, a.dtype.str)
+
+def attachArray(descriptor):
+    """
+    read-only np.array() view of shared memory descriptor from shareArray()
+    """
+
+    name, shape, dtype = descriptor
+    if name not in attached:
+        try:
+            attached[name] = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError: # Python < 3.13
+            attached[name] = shared_memory.SharedMemory(name=name)
+    a = np.ndarray(shape, dtype, buffer=attached[name].buf)
+    a.flags.writeable = False
+    return a
+
+def detachArrays():
+    """
+    close the shared memory attached by this process, sources viewing it are dropped
+    from sourceCache first, handles with views still referenced elsewhere stay attached
+    """
+
+    for name in list(attached):
+        sourceCache.pop(name, None)
+    gc.collect() # views held in reference cycles
+
+    for name, shm in list(attached.items()):
+        try:
+            shm.close()
+        except BufferError: # exported views, closed when they are released
+            continue
+        del attached[name]
+
+def getSource(source, context):
+    """
+    xyzData of pipeline source name (shared) or file name, cached per process by shared
+    memory name or by file name and modification time
+    """
+
+    shared = context['shared'].get(source)
+    if shared is not None:
+        key = shared['data'][0]
+    else:
+        fileName = context['sourceFiles'].get(source, source)
+        key = (fileName, os.path.getmtime(fileName))
+
+    if key not in sourceCache:
+        if shared is not None:
+            x = xyzData()
+            x.fileName = shared['fileName']
+            x.setData(attachArray(shared['data']), dict(shared['index']))
+        else:
+            x = xyzData(fileName)
+        sourceCache[key] = x
+    return sourceCache[key]
+
+# ---------------------------------------------------------------------------
+# jobs
+# ---------------------------------------------------------------------------
+
+def formatPath(pattern, context):
+    """
+    file name pattern with {stem} (input file name without extension) and {tile}
+    """
+
+    return pattern.format(stem=context['stem'], tile=context['tile'])
+
+def tileBoxes(bBox, size):
+    """
+    bounding boxes of tiles of edge length size covering bBox ((x0,y0,z0),(x1,y1,z1)),
+    the upper bound is raised by one ulp so points on it fall into the half open last tiles
+    """
+
+    lo, hi = np.array(bBox[0], dtype=np.float64), np.nextafter(np.array(bBox[1], dtype=np.float64), np.inf)
+    n = np.maximum(np.ceil((hi-lo)/size).astype(int), 1)
+    return [(tuple(lo + np.array(ijk)*size), tuple(np.minimum(lo + (np.array(ijk)+1)*size, hi))) \
+            for ijk in np.ndindex(*n)]
+
+def stageHash(stageList, context):
+    """
+    hash of the stages up to and including the last one, the job identity and the digests
+    of the tile rows and shared sources
+    """
+
+    text = json.dumps([stageList, context['input'], context['tile'], context.get('bBox'), \
+                       context.get('digest'), context['sourceDigests']], sort_keys=True, \
+                      default=lambda o: getattr(o, '__qualname__', str(o)))
+    return hashlib.sha1(text.encode()).hexdigest()
+
+def upToDate(fileName, stamp, inputTime):
+    """
+    True if fileName exists, is not older than inputTime and was written with stamp
+    """
+
+    try:
+        with open(fileName + '.json') as f:
+            return json.load(f)['hash']==stamp and os.path.getmtime(fileName) >= inputTime
+    except (OSError, ValueError, KeyError):
+        return False
+
+def outputOf(s, context):
+    """
+    output file of stage s or None
+    """
+
+    fileName = s.get('fileName') if s['stage']=='write' else s.get('output')
+    return None if fileName is None else formatPath(fileName, context)
+
+def resumable(s):
+    """
+    True if the output of stage s holds the complete data in order, so that later stages
+    can resume from it (not a write of selected columns or in Morton order)
+    """
+
+    return s['stage']!='write' or (s.get('columns') is None and not s.get('sort', False))
+
+def runJob(stageList, context):
+    """
+    run stages for one job (worker process), resuming after the last up to date output
+
+    returns summary dict
+    """
+
+    t0 = time.perf_counter()
+    summary = {'job': context['input'] or context['tile'], 'index': context['job'], \
+               'run': [], 'skipped': [], 'rows': None, 'error': None}
+
+    try:
+        # inputs: job file and source files
+        inputTime = 0.0
+        sources = [s['source'] for s in stageList if s['stage']=='mapData']
+        for fileName in [context['input']] + [context['sourceFiles'].get(s, s) for s in sources] + \
+                        [context['shared'][s]['fileName'] for s in sources if s in context['shared']]:
+            if fileName and os.path.isfile(fileName):
+                inputTime = max(inputTime, os.path.getmtime(fileName))
+
+        # resume after the last up to date output
+        start, data = 0, None
+        for k in range(len(stageList)-1, -1, -1):
+            output = outputOf(stageList[k], context)
+            if k+1 < len(stageList) and not resumable(stageList[k]):
+                continue
+            if output and upToDate(output, stageHash(stageList[:k+1], context), inputTime):
+                start = k+1
+                if start < len(stageList):
+                    data = xyzData(output)
+                break
+        summary['skipped'] = [s['stage'] for s in stageList[:start]]
+
+        # tile jobs: rows of the shared data inside the tile
+        if data is None and start < len(stageList) and context['tile']!='':
+            shared = context['shared']['__data__']
+            a = attachArray(shared['data'])
+            lo, hi = np.array(context['bBox'][0]), np.array(context['bBox'][1])
+            inside = np.all((a[:,0:3] >= lo) & (a[:,0:3] < hi), axis=1) # half open, no double counting
+            data = xyzData()
+            data.fileName = f"tile {context['tile']}"
+            data.setData(a[inside], dict(shared['index']))
+
+        for k in range(start, len(stageList)):
+            s = stageList[k]
+            parameters = {key: value for key, value in s.items() if key not in ['stage','output']}
+            with config.span('pipeline.' + s['stage']):
+                result = stages[s['stage']](data, context, **parameters)
+            data = data if result is None else result
+
+            output = outputOf(s, context)
+            if output:
+                if s['stage']!='write':
+                    data.write(output)
+                with open(output + '.json', 'w') as f:
+                    json.dump({'hash': stageHash(stageList[:k+1], context), 'stage': s['stage']}, f)
+            summary['run'].append(s['stage'])
+
+        summary['rows'] = None if data is None else len(data.current)
+
+    except Exception as e:
+        summary['error'] = f"{type(e).__name__}: {e}"
+
+    summary['seconds'] = time.perf_counter() - t0
+    return summary
+
+# ~def runJob()
+
+# ---------------------------------------------------------------------------
+# class pipeline()
+# ---------------------------------------------------------------------------
+
+class pipeline:
+
+    def __init__(self, stageList, sources=None):
+        """
+        constructor for pipeline()
+
+        stageList: list of {'stage': name, parameters...}, see notes
+        sources: {name: xyzData or file name} for mapData stages, xyzData are shared
+        """
+
+        for s in stageList:
+            if s.get('stage') not in stages:
+                print (f"Error: pipeline stage '{s.get('stage')}' not in {list(stages)}")
+                raise TypeError
+
+        self.stageList = stageList
+        self.sources = sources or {}
+
+    # ~def __init__(self, stageList, sources=None)
+
+    def __str__(self):
+        return "pipeline: " + " -> ".join(s['stage'] for s in self.stageList)
+
+    @config.timed('pipeline.run')
+    def run(self, files=None, data=None, tiles=None, workers=None, memoryLimit=None, memoryFactor=4.0):
+        """
+        method to run the pipeline for each of files, or for each tile bounding box of
+        xyzData data (tileBoxes())
+
+        workers: processes (default os.cpu_count()), 0 runs the jobs in this process
+        memoryLimit: bytes, jobs start while the sum of their estimates fits (one always runs)
+        memoryFactor: estimate is memoryFactor x file size or x tile array size
+
+        returns list of job summaries {'job','run','skipped','rows','error','seconds'}
+        """
+
+        sourceCache.clear() # sources of earlier runs, also inherited by forked workers
+        owned, shared, sourceFiles, sourceDigests = [], {}, {}, {}
+        try:
+            # shared memory: xyzData sources and tiled data
+            for name, source in self.sources.items():
+                if isinstance(source,xyzData):
+                    shm, descriptor = shareArray(source.current)
+                    owned.append(shm)
+                    shared[name] = {'data': descriptor, 'index': source.index, 'fileName': source.fileName}
+                    sourceDigests[name] = config.hashKey(source.current, sorted(source.index.items()))
+                else:
+                    sourceFiles[name] = source
+
+            jobs = []
+            if files is not None:
+                for fileName in files:
+                    stem = os.path.splitext(os.path.basename(fileName))[0]
+                    jobs.append(({'input': fileName, 'stem': stem, 'tile': ''}, \
+                                 os.path.getsize(fileName)*memoryFactor))
+            if data is not None:
+                a = data.current
+                shm, descriptor = shareArray(a)
+                owned.append(shm)
+                shared['__data__'] = {'data': descriptor, 'index': data.index, 'fileName': data.fileName}
+                stem = os.path.splitext(os.path.basename(data.fileName))[0] if data.fileName else 'tiles'
+                for t, bBox in enumerate(tiles or [(data.bBox[0], np.nextafter(data.bBox[1], np.inf))]):
+                    bBox = (tuple(map(float, bBox[0])), tuple(map(float, bBox[1])))
+                    inside = np.all((a[:,0:3] >= bBox[0]) & (a[:,0:3] < bBox[1]), axis=1)
+                    rows = np.count_nonzero(inside)
+                    if rows==0: # empty tiles are not jobs
+                        continue
+                    digest = config.hashKey(a[inside], sorted(data.index.items()))
+                    jobs.append(({'input': None, 'stem': stem, 'tile': t, 'bBox': bBox, 'digest': digest}, \
+                                 rows*a.shape[1]*8*memoryFactor))
+            for j, (context, _) in enumerate(jobs):
+                context.update({'shared': shared, 'sourceFiles': sourceFiles, 'sourceDigests': sourceDigests, \
+                                'job': j})
+
+            # run, limited by workers and memory
+            # ----------------------------------
+            results = []
+            if workers==0:
+                try:
+                    results = [runJob(self.stageList, context) for context, _ in jobs]
+                finally:
+                    detachArrays()
+            else:
+                workers = workers or os.cpu_count()
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    pending, running, used = list(jobs), {}, 0.0
+                    while pending or running:
+                        while pending and len(running) < workers and \
+                              (not running or memoryLimit is None or used + pending[0][1] <= memoryLimit):
+                            context, estimate = pending.pop(0)
+                            running[pool.submit(runJob, self.stageList, context)] = estimate
+                            used += estimate
+                        done, _ = wait(running, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            used -= running.pop(future)
+                            results.append(future.result())
+                results.sort(key=lambda r: r['index'])
+
+        finally:
+            for shm in owned:
+                shm.close()
+                shm.unlink()
+
+        for r in results:
+            if r['error']:
+                print (f"Error: pipeline job {r['job']}: {r['error']}")
+            elif config.verbose:
+                print (f"pipeline job {r['job']}: ran {r['run']}, skipped {r['skipped']}, " + \
+                       f"{r['rows']} rows, {r['seconds']:.2f} seconds")
+        config.count('pipeline.jobs', len(results))
+
+        return results
+
+    # ~def run()
@@ -21,23 +21,120 @@ If not, see <https://www.gnu.org/licenses/>.
 
 import numpy as np
 
-import matplotlib.pyplot as plt
-import matplotlib
-from mpl_toolkits.mplot3d.art3d import Poly3DCollection
-
 from stressUtils import rot_x, rot_y, rot_z
 from gridData import *
+from stlGeom import stlGeom, decimateVectors
 import config
 
+# matplotlib is imported on first use (headless / batch workers)
+plt = config.lazyImport('matplotlib.pyplot')
+matplotlib = config.lazyImport('matplotlib')
+art3d = config.lazyImport('mpl_toolkits.mplot3d.art3d')
+
+# ---------------------------------------------------------------------------
+# functions
+# ---------------------------------------------------------------------------
+
+def binPoints(points: np.ndarray, var, maxPoints):
+    """
+    aggregate points on a regular lattice to at most maxPoints occupied cells
+
+    - cell size adapted from the bounding box until the budget is met
+    - representative point is the mean x,y,z and mean points[:,var] per cell
+
+    returns np.array() of shape (M, 4) [x,y,z,value] and point count per cell (M,)
+    """
+
+    xyz = points[:,0:3]
+    b0, b1 = xyz.min(axis=0), xyz.max(axis=0)
+    size = max(np.linalg.norm(b1-b0)/pow(3,.5), 1e-9)
+    cellSize = size / pow(maxPoints,1./3.)
+
+    best, shrink = None, 0
+    while shrink < 8:
+        ijk = ((xyz - b0) / cellSize).astype(np.int64)
+        n = ijk.max(axis=0) + 1
+        key = (ijk[:,0]*n[1] + ijk[:,1])*n[2] + ijk[:,2]
+        keys, cell, count = np.unique(key, return_inverse=True, return_counts=True)
+        if len(keys) <= maxPoints:
+            best = keys, cell, count, cellSize
+            if len(keys) > 0.5*maxPoints:
+                break
+            shrink += 1
+        elif best is not None:
+            break
+        cellSize *= pow(len(keys)/maxPoints, 1./3.)*1.02 # occupied cells ~ cellSize^-3
+    keys, cell, count, cellSize = best
+
+    cell = cell.reshape(-1)
+    binned = np.stack([np.bincount(cell, points[:,c], len(keys)) for c in (0,1,2,var)], axis=1)
+    binned /= count[:,None]
+
+    if config.verbose:
+        print(f"binPoints: {len(points)} points in {len(keys)} cells of size {cellSize}")
+
+    return binned, count
+
+def scatterPoints(ax, points: np.ndarray, var, maxPoints=None, **kwargs):
+    """
+    scatter points[:,0:3] coloured by points[:,var], binned if more than maxPoints
+    with point area weighted by count per cell
+    """
+
+    if maxPoints and len(points) > maxPoints:
+        points, count = binPoints(points, var, maxPoints)
+        var = 3
+        area = matplotlib.rcParams['lines.markersize']**2
+        kwargs['s'] = area*np.clip(count/np.median(count), 0.25, 16.)
+
+    return ax.scatter(points[:,0],points[:,1],points[:,2], c=points[:,var], **kwargs)
+
+def newFigure(fileName=None):
+    """
+    pyplot figure, or offscreen Agg figure (no pyplot state) if saved to fileName
+    """
+
+    if fileName:
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        fig = Figure()
+        FigureCanvasAgg(fig)
+        return fig
+    return plt.figure()
+
+def showFigure(fig, fileName=None, dpi=150):
+    """
+    show figure, or save offscreen figure to fileName (e.g. png)
+    """
+
+    if fileName:
+        fig.savefig(fileName, dpi=dpi)
+        if config.verbose:
+            print (f"saved: {fileName}")
+    else:
+        plt.show()
+
 # ---------------------------------------------------------------------------
 # class plot3DVoxel()
 # ---------------------------------------------------------------------------
 
 class plot3DVoxel:
 
-    def __init__(self, g: gridData, elev=12.5, azim=-22.5):
+    # unit cube faces (normal axis, side) and their corners
+    faces = [(0,0,[[0,0,0],[0,1,0],[0,1,1],[0,0,1]]), (0,1,[[1,0,0],[1,1,0],[1,1,1],[1,0,1]]), \
+             (1,0,[[0,0,0],[1,0,0],[1,0,1],[0,0,1]]), (1,1,[[0,1,0],[1,1,0],[1,1,1],[0,1,1]]), \
+             (2,0,[[0,0,0],[1,0,0],[1,1,0],[0,1,0]]), (2,1,[[0,0,1],[1,0,1],[1,1,1],[0,1,1]])]
+
+    def __init__(self, g: gridData, elev=12.5, azim=-22.5, values=None, gap=0.0, fileName=None):
         """
         constructor for plot3DVoxel()
+
+        - colour and transparency from points per cell, or values of shape g.shape
+          (e.g. stlGeom.voxelize()), cells with values > 0 are drawn
+        - voxels shrunk by gap*cellSize on each side (e.g. 0.1)
+        - with gap==0 faces hidden by an occupied neighbour are culled, with gap > 0 (the
+          gap shows them) interior voxels with six occupied neighbours are culled,
+          the remaining faces are drawn as one Poly3DCollection
         """
 
         if not isinstance(g,gridData):
@@ -48,57 +145,62 @@ class plot3DVoxel:
         cmaps = ['viridis', 'plasma', 'inferno', 'magma', 'cividis', 'turbo'][-1]
         cmap = matplotlib.colormaps[cmaps]
 
-        i,j,k = np.indices(g.shape) # for all indices in grid, not g.cells.keys()
-        n_vox = np.zeros(g.shape, dtype=bool)
-        for ijk in g.cells.keys(): n_vox[ijk]=True
-
-        cmax = 0 # max number of data points in a cell for colormap
-        for ijk in g.cells.keys():
-            cmax = max(cmax,len(g.cells[ijk]))
-
-        # initialise arrays for face, edge colours 
-        n_map = np.zeros(g.shape+(1,), dtype=object)
-        n_edge= np.zeros(g.shape+(1,), dtype=object)
-
-        # face, edge colours and alpha (transparencey) for each voxel
-        for ijk in g.cells.keys():
-            cval = min(0.0+len(g.cells[ijk])/cmax*2,1.0)
-            calp = min(0.0+len(g.cells[ijk])/cmax*2,0.75)
-            chex = hex(256+int(calp*255))[-2:]
-            n_map[ijk] = matplotlib.colors.rgb2hex(cmap(cval))+chex
-            n_edge[ijk]= matplotlib.colors.rgb2hex(cmap(cval))+chex
-
-        # shrinking the voxels 
-        # https://matplotlib.org/stable/gallery/mplot3d/voxels_numpy_logo.html
-
-        def explode(data):
-            size = np.array(data.shape)*2
-            data_e = np.zeros(size - 1, dtype=data.dtype)
-            data_e[::2, ::2, ::2] = data
-            return data_e
-
-        # upscale the above voxel image, leaving gaps
-        n_vox2 = explode(n_vox)
-        n_map2 = explode(n_map)
-        n_edge2 = explode(n_edge)
-
-        # shrink the gaps
-        x, y, z = np.indices(np.array(n_vox2.shape) + 1).astype(float) // 2
-        x[0::2, :, :] = (x[0::2, :, :]+0.1)*g.cellSize + g.bBox[0][0]
-        y[:, 0::2, :] = (y[:, 0::2, :]+0.1)*g.cellSize + g.bBox[0][1]
-        z[:, :, 0::2] = (z[:, :, 0::2]+0.1)*g.cellSize + g.bBox[0][2]
-        x[1::2, :, :] = (x[1::2, :, :]+0.9)*g.cellSize + g.bBox[0][0]
-        y[:, 1::2, :] = (y[:, 1::2, :]+0.9)*g.cellSize + g.bBox[0][1]
-        z[:, :, 1::2] = (z[:, :, 1::2]+0.9)*g.cellSize + g.bBox[0][2]
+        # dense values: points per cell (default) or values
+        if values is None:
+            values = np.zeros(g.shape)
+            if len(g.cells):
+                ijk = np.array(list(g.cells.keys()))
+                values[tuple(ijk.T)] = [len(c) for c in g.cells.values()]
+        else:
+            values = np.nan_to_num(np.asarray(values, dtype=float).reshape(g.shape))
+        n_vox = values > 0
+        cmax = values.max() if n_vox.any() else 1.0 # max value in a cell for colormap
+
+        # visible faces: occupied cell with empty (or no) neighbour, with a gap all faces
+        # of voxels with at least one empty neighbour
+        occ = np.pad(n_vox, 1)
+        if gap > 0:
+            interior = n_vox.copy()
+            for axis in range(3):
+                for side in (0, 2):
+                    shift = [slice(1,-1)]*3
+                    shift[axis] = slice(side, side+g.shape[axis])
+                    interior &= occ[tuple(shift)]
+            n_vox = n_vox & ~interior
+            occ = np.zeros(occ.shape, dtype=bool)
+        verts, colours = [], []
+        for axis, side, corners in self.faces:
+            shift = [slice(1,-1)]*3
+            shift[axis] = slice(2,None) if side else slice(0,-2)
+            visible = n_vox & ~occ[tuple(shift)]
+            ijk = np.argwhere(visible)
+            corners = gap + np.array(corners)*(1-2*gap)
+            verts.append((ijk[:,None,:] + corners[None,:,:])*g.cellSize + np.array(g.bBox[0]))
+            colours.append(values[visible])
+        verts = np.concatenate(verts)
+
+        # face, edge colours and alpha (transparency) for each visible face, RGBA
+        cval = np.minimum(np.concatenate(colours)/cmax*2, 1.0)
+        colours = cmap(cval)
+        colours[:,3] = np.minimum(cval, 0.75)
+
+        if config.verbose:
+            print(f"plot3DVoxel: {n_vox.sum()} voxels, {len(verts)} visible faces")
 
         # create and show plot
-        ax = plt.figure().add_subplot(projection='3d')
-        ax.voxels(x, y, z, n_vox2, facecolors=n_map2, edgecolors=n_edge2) # ax.voxels(n_vox, facecolors=n_map)
+        fig = newFigure(fileName)
+        ax = fig.add_subplot(projection='3d')
+        ax.add_collection3d(art3d.Poly3DCollection(verts, facecolors=colours, edgecolors=colours))
+
+        x0, x1 = np.array(g.bBox[0]), np.array(g.bBox[0]) + np.array(g.shape)*g.cellSize
+        ax.axes.set_xlim3d(left=x0[0], right=x1[0])
+        ax.axes.set_ylim3d(bottom=x0[1], top=x1[1])
+        ax.axes.set_zlim3d(bottom=x0[2], top=x1[2])
 
-        ax.view_init(elev=12.5, azim=-22.5)
+        ax.view_init(elev=elev, azim=azim)
         ax.set_aspect('equal')
 
-        plt.show()
+        showFigure(fig, fileName)
 
     # ~def __init__()
 
@@ -111,20 +213,22 @@ class plot3DVoxel:
 
 class plot3D:
 
-    def __init__(self, points: np.ndarray, var, vmin=None, vmax=None, elev=12.5, azim=-22.5):
+    def __init__(self, points: np.ndarray, var, vmin=None, vmax=None, elev=12.5, azim=-22.5, \
+                 maxPoints=None, fileName=None):
         """
         constructor for plot3D()
+
+        maxPoints: point budget, larger sets are binned (mean colour, count weighted size)
+        fileName: render offscreen (Agg) and save to fileName instead of showing
         """
 
         # https://matplotlib.org/stable/gallery/color/colormap_reference.html
         cmaps = ['viridis', 'plasma', 'inferno', 'magma', 'cividis', 'turbo'][-1]
 
-        fig = plt.figure()
+        fig = newFigure(fileName)
         ax = fig.add_subplot(projection='3d')
 
-        plt_colours = points[:,var]
-    
-        fax = ax.scatter(points[:,0],points[:,1],points[:,2], vmin=vmin, vmax=vmax, c=plt_colours , cmap=cmaps)
+        fax = scatterPoints(ax, points, var, maxPoints, vmin=vmin, vmax=vmax, cmap=cmaps)
 
         ax.set_xlabel('X')
         ax.set_ylabel('Y')
@@ -138,8 +242,8 @@ class plot3D:
 
         ax.view_init(elev=elev, azim=azim, roll=0) # updates ax.azim, ax.elev on close
         ax.set_aspect('equal')
-        plt.colorbar(fax)
-        plt.show()
+        fig.colorbar(fax, ax=ax)
+        showFigure(fig, fileName)
 
         if config.verbose:
             print(f"elev {ax.elev}, azim {ax.azim}")
@@ -197,7 +301,7 @@ class plot3DCube:
             ax.plot([e[0][0],e[1][0]],[e[0][1],e[1][1]],[e[0][2],e[1][2]],'k-')
  
         # plot faces
-        faces = Poly3DCollection(fList, alpha=0.05)
+        faces = art3d.Poly3DCollection(fList, alpha=0.05)
         faces.set_facecolor('k')
         ax.add_collection3d(faces)
 
@@ -216,7 +320,7 @@ class plot3DCube:
         for o in orientations:
             f=cFaces[o[1]]
             fList=[[pNodes[f[0]],pNodes[f[1]],pNodes[f[2]],pNodes[f[3]]]]
-            faces = Poly3DCollection(fList, alpha=0.75)
+            faces = art3d.Poly3DCollection(fList, alpha=0.75)
             faces.set_facecolor(o[0])
             ax.add_collection3d(faces)
 
@@ -226,47 +330,45 @@ class plot3DCube:
     # ~def __init__()
 
 # ---------------------------------------------------------------------------
-# class plot3Dgeo() - requires stl, a non-standard package: pip install numpy-stl
+# class plot3Dgeo() - stl meshes require numpy-stl, a non-standard package: pip install numpy-stl
 # ---------------------------------------------------------------------------
 
-try:
-    from stl import mesh
-    from mpl_toolkits import mplot3d
-
-    class plot3Dgeo:
+class plot3Dgeo:
 
-        def __init__(self, points: np.ndarray=None, stlMesh=None, var=3):
-            """
-            constructor for plot3D()
-        
-            points: np.ndarray of shape (N, 3 or more), with color in points[:,var]
-            """
-
-            # https://matplotlib.org/stable/gallery/color/colormap_reference.html
-            #usescientificcolourmaps suggested by https://www.linkedin.com/in/lindsey-smith-17665622a/
-            cmaps = ['viridis', 'plasma', 'inferno', 'magma', 'cividis'][2]
+    def __init__(self, points: np.ndarray=None, stlMesh=None, var=3, maxTriangles=100000, \
+                 maxPoints=None, fileName=None):
+        """
+        constructor for plot3D()
+    
+        points: np.ndarray of shape (N, 3 or more), with color in points[:,var]
+        stlMesh: stl.mesh.Mesh or stlGeom (cached levels of detail)
+        maxTriangles: triangle budget, larger meshes are decimated
+        maxPoints: point budget, larger sets are binned
+        fileName: render offscreen (Agg) and save to fileName instead of showing
+        """
 
-            fig = plt.figure()
-            ax = fig.add_subplot(projection='3d')
+        # https://matplotlib.org/stable/gallery/color/colormap_reference.html
+        #usescientificcolourmaps suggested by https://www.linkedin.com/in/lindsey-smith-17665622a/
+        cmaps = ['viridis', 'plasma', 'inferno', 'magma', 'cividis'][2]
 
-            plt_colours = points[:,var]
-    
-            fax = ax.scatter(points[:,0],points[:,1],points[:,2], c=plt_colours , cmap=cmaps)
+        fig = newFigure(fileName)
+        ax = fig.add_subplot(projection='3d')
 
-            if stlMesh:
-                your_mesh = stlMesh
-                ax.add_collection3d(mplot3d.art3d.Poly3DCollection(your_mesh.vectors))
+        fax = scatterPoints(ax, points, var, maxPoints, cmap=cmaps)
 
-            ax.set_xlabel('X')
-            ax.set_ylabel('Y')
-            ax.set_zlabel('Z')
+        if isinstance(stlMesh,stlGeom):
+            ax.add_collection3d(art3d.Poly3DCollection(stlMesh.decimate(maxTriangles).vectors))
+        elif stlMesh:
+            ax.add_collection3d(art3d.Poly3DCollection( \
+                decimateVectors(stlMesh.vectors, maxTriangles)))
 
-            ax.view_init(elev=12.5, azim=-22.5) # updates ax.azim, ax.elev on close
+        ax.set_xlabel('X')
+        ax.set_ylabel('Y')
+        ax.set_zlabel('Z')
 
-            plt.colorbar(fax)
-            plt.show()
+        ax.view_init(elev=12.5, azim=-22.5) # updates ax.azim, ax.elev on close
 
-        # ~def __init__(self, points: np.ndarray, stlMesh, var)
+        fig.colorbar(fax, ax=ax)
+        showFigure(fig, fileName)
 
-except ImportError:
-    print('stl import failed. plot3Dgeo() requires numpy-stl')
\ No newline at end of file
+    # ~def __init__(self, points: np.ndarray, stlMesh, var)
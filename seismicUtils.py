@@ -0,0 +1,253 @@
+"""
+seismicUtils.py - Copyright 2024 S.M.Arndt, Cavroc Pty Ltd
+Visit https://cavroc.com/ for more information on IUCM and StopeX
+
+This file is part of geotechTools (https://github.com/SMArndt/geotechTools).
+
+geotechTools is free software: you can redistribute it and/or modify it under the
+terms of the GNU General Public License as published by the Free Software Foundation.
+
+geotechTools is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with geotechTools.
+If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# ---------------------------------------------------------------------------
+# notes
+# ---------------------------------------------------------------------------
+# - b-value: Aki-Utsu maximum likelihood with binning correction
+#   b = log10(e) / (mean(M) - (Mc - dm/2)), error after Shi & Bolt (1982)
+# - a-value: log10 N(M >= Mc) + b Mc, mMaxGR = a/b is the magnitude expected once
+# - all statistics are sums per group (np.bincount), so a million cells cost a few
+#   passes over the events rather than a fit per cell
+
+# ---------------------------------------------------------------------------
+# imports
+# ---------------------------------------------------------------------------
+
+import numpy as np
+
+from xyzData import xyzData
+import config
+
+LOG10E = np.log10(np.e)
+
+# ---------------------------------------------------------------------------
+# functions
+# ---------------------------------------------------------------------------
+
+def magnitudeCompleteness(mags, dm=0.1):
+    """
+    magnitude of completeness Mc by maximum curvature (mode of the binned magnitudes),
+    rounded to the decimals of dm so that mags >= Mc keeps the whole modal bin
+    """
+
+    mags = np.round(mags[np.isfinite(mags)]/dm)*dm
+    if len(mags)==0:
+        return np.nan
+    values, counts = np.unique(mags, return_counts=True)
+    return np.round(values[np.argmax(counts)], max(0, int(np.ceil(-np.log10(dm)))) + 1)
+
+def bValue(mags, mc, dm=0.1):
+    """
+    Aki-Utsu b-value of magnitudes >= mc along the last axis (nan ignored)
+    """
+
+    mags = np.where(mags >= mc, mags, np.nan)
+    return LOG10E / (np.nanmean(mags, axis=-1) - (mc - dm/2))
+
+@config.timed('seismicUtils.groupStats')
+def groupStats(groups, mags, nGroups, mc, dm=0.1, moments=None, nBoot=0, seed=0, chunk=2**24):
+    """
+    Gutenberg-Richter statistics per group
+
+    groups: int group per event (N,), -1 to skip
+    mags: magnitudes (N,), events with mags < mc or nan are not counted
+    moments: seismic moment per event (N,) or None, summed over all events of the group
+    nBoot: bootstrap replicates for bStd, drawn in batches of chunk events
+
+    returns dict of np.array() (nGroups,): n, b, bErr, bStd, a, mMaxObs, mMaxGR, moment
+    """
+
+    groups = np.asarray(groups, dtype=np.int64)
+    use = (groups >= 0) & np.isfinite(mags) & (mags >= mc)
+    g, m = groups[use], mags[use]
+
+    # moments of the magnitude distribution per group
+    # ------------------------------------------------
+    n = np.bincount(g, minlength=nGroups).astype(np.float64)
+    s1 = np.bincount(g, weights=m-mc, minlength=nGroups)
+    s2 = np.bincount(g, weights=(m-mc)**2, minlength=nGroups)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = s1/n
+        b = LOG10E / (mean + dm/2)
+        bErr = 2.3 * b**2 * np.sqrt((s2 - n*mean**2) / (n*(n-1)))
+        a = np.log10(n) + b*mc
+        mMaxGR = a/b
+    b[n==0] = np.nan
+
+    # observed maximum, last event of each group after sorting by (group, mag)
+    order = np.lexsort((m, g))
+    last = np.searchsorted(g[order], np.arange(nGroups), side='right') - 1
+    mMaxObs = np.where(n>0, m[order][np.maximum(last,0)] if len(m) else np.nan, np.nan)
+
+    # cumulative seismic moment
+    if moments is None:
+        moment = np.full(nGroups, np.nan)
+    else:
+        valid = (groups >= 0) & np.isfinite(moments)
+        moment = np.bincount(groups[valid], weights=moments[valid], minlength=nGroups)
+
+    # bootstrap: resample each group's events with replacement, nBoot times
+    # ----------------------------------------------------------------------
+    bStd = np.full(nGroups, np.nan)
+    if nBoot > 0 and len(m):
+        rng = np.random.default_rng(seed)
+        gs, ms = g[order], m[order] - mc
+        start = np.searchsorted(gs, np.arange(nGroups))
+        sum1, sum2 = np.zeros(nGroups), np.zeros(nGroups)
+        batch = max(1, chunk//len(ms))
+        for r in range(0, nBoot, batch):
+            k = min(batch, nBoot-r)
+            draw = start[gs] + (rng.random((k, len(ms))) * n[gs]).astype(np.int64)
+            rep = np.arange(k)[:,None]*nGroups + gs
+            sums = np.bincount(rep.ravel(), weights=ms[draw].ravel(), minlength=k*nGroups).reshape(k,nGroups)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                mean = sums / n
+                bRep = LOG10E / (mean + dm/2)
+            sum1 += np.nansum(bRep, axis=0)
+            sum2 += np.nansum(bRep**2, axis=0)
+        with np.errstate(invalid='ignore'):
+            bStd = np.sqrt(np.maximum(sum2/nBoot - (sum1/nBoot)**2, 0.0))
+        bStd[n < 2] = np.nan
+        config.count('seismicUtils.bootstrap draws', nBoot*len(ms))
+
+    config.count('seismicUtils.events grouped', len(m))
+    return {'n': n, 'b': b, 'bErr': bErr, 'bStd': bStd, 'a': a, \
+            'mMaxObs': mMaxObs, 'mMaxGR': mMaxGR, 'moment': moment}
+
+# ~def groupStats()
+
+@config.timed('seismicUtils.neighbourStats')
+def neighbourStats(centres, xyz, mags, nearest, mc, dm=0.1, maxDist=np.inf, nBoot=0, seed=0, \
+                   workers=-1, chunk=2**24):
+    """
+    Gutenberg-Richter statistics of the nearest events with mags >= mc around each centre
+
+    centres: np.array() of shape (C, 3), xyz: event locations (N, 3)
+    nearest: events per neighbourhood, maxDist limits the neighbourhood radius
+    workers: KDTree query threads (-1: all cores)
+
+    returns dict of np.array() (C,): n, b, bErr, bStd, a, mMaxObs, mMaxGR, radius
+    """
+
+    from scipy.spatial import KDTree
+
+    use = np.isfinite(mags) & (mags >= mc)
+    xyz, m = xyz[use,0:3], mags[use]-mc
+    nearest = min(nearest, len(m))
+    C = len(centres)
+
+    result = {key: np.full(C, np.nan) for key in ['n','b','bErr','bStd','a','mMaxObs','mMaxGR','radius']}
+    if nearest == 0:
+        return result
+
+    with config.span('seismicUtils.neighbourStats KDTree'):
+        tree = KDTree(xyz)
+
+    rng = np.random.default_rng(seed)
+    step = max(1, chunk//(nearest*max(nBoot,1)))
+    for c in range(0, C, step):
+        dist, idx = tree.query(centres[c:c+step,0:3], nearest, distance_upper_bound=maxDist, workers=workers)
+        dist, idx = dist.reshape(len(dist),-1), idx.reshape(len(idx),-1)
+        inside = idx < len(m)
+        M = np.where(inside, m[np.minimum(idx, len(m)-1)], np.nan)
+
+        n = inside.sum(axis=1).astype(np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = np.nansum(M, axis=1)/n
+            b = LOG10E / (mean + dm/2)
+            var = np.nansum((M-mean[:,None])**2, axis=1)
+            result['bErr'][c:c+step] = 2.3 * b**2 * np.sqrt(var / (n*(n-1)))
+            result['a'][c:c+step] = np.log10(n) + b*mc
+            result['mMaxGR'][c:c+step] = result['a'][c:c+step]/b
+            result['mMaxObs'][c:c+step] = np.where(n>0, np.max(np.where(inside, M, -np.inf), axis=1) + mc, np.nan)
+            result['radius'][c:c+step] = np.max(np.where(inside, dist, 0.0), axis=1)
+        result['n'][c:c+step] = n
+        result['b'][c:c+step] = b
+
+        if nBoot > 0:
+            # full neighbourhoods only, resampled nBoot times in one batch
+            draw = rng.integers(0, nearest, size=(len(M), nBoot, nearest))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                bRep = LOG10E / (np.take_along_axis(M[:,None,:], draw, axis=2).mean(axis=2) + dm/2)
+            result['bStd'][c:c+step] = np.where(n==nearest, bRep.std(axis=1), np.nan)
+
+    config.count('seismicUtils.neighbourhoods', C)
+    return result
+
+# ~def neighbourStats()
+
+@config.timed('seismicUtils.gridHazard')
+def gridHazard(grid, data, mag='local magnitude', moment='seismic moment', mc=None, dm=0.1, \
+               nearest=None, minEvents=50, **kwargs):
+    """
+    b-value, Mmax and cumulative seismic moment per cell of gridData grid
+
+    data: xyzData (columns by name mag, moment) or np.array() of shape (N, 5) x,y,z,mag,moment
+    mc: magnitude of completeness, None: magnitudeCompleteness() of all events
+    nearest: None for the events inside each cell, or the number of nearest events around
+             each cell centre (all cells of grid.shape)
+    minEvents: cells with fewer events are nan (at most nearest in neighbourhood mode)
+    kwargs: nBoot, seed, workers, chunk, maxDist, see groupStats() and neighbourStats()
+
+    returns dict of dense np.array() of shape grid.shape, and mc
+    """
+
+    if isinstance(data,xyzData):
+        events = data.current
+        mags = events[:,data.index[mag]]
+        moments = events[:,data.index[moment]] if moment in data.index else None
+    elif isinstance(data,np.ndarray):
+        events = data
+        mags = events[:,3]
+        moments = events[:,4] if events.shape[1] > 4 else None
+    else:
+        print ('Error: requires np.ndarray or xyzData')
+        raise TypeError
+
+    if mc is None:
+        mc = magnitudeCompleteness(mags, dm)
+
+    shape = grid.shape
+    cell = grid.cellIndex(events)
+
+    if nearest is None:
+        stats = groupStats(cell, mags, int(np.prod(shape)), mc, dm, moments, \
+                           **{k: v for k, v in kwargs.items() if k in ['nBoot','seed','chunk']})
+    else:
+        centres = grid.cellCentres(np.argwhere(np.ones(shape, dtype=bool)))
+        stats = neighbourStats(centres, events, mags, nearest, mc, dm, **kwargs)
+        minEvents = min(minEvents, nearest)
+        valid = np.isfinite(moments) & (cell >= 0) if moments is not None else None
+        stats['moment'] = np.bincount(cell[valid], weights=moments[valid], minlength=len(centres)) \
+                          if moments is not None else np.full(len(centres), np.nan)
+
+    sparse = stats['n'] < minEvents
+    for key in stats:
+        if key not in ['n','moment']:
+            stats[key][sparse] = np.nan
+
+    result = {key: value.reshape(shape) for key, value in stats.items()}
+    result['mc'] = mc
+
+    if config.verbose:
+        print (f"gridHazard mc {mc}: {np.sum(~sparse)} of {sparse.size} cells with {minEvents} or more events")
+
+    return result
+
+# ~def gridHazard()
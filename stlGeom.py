@@ -19,13 +19,13 @@ If not, see <https://www.gnu.org/licenses/>.
 # imports
 # ---------------------------------------------------------------------------
 
-import stl
 import os
-import time
 import config
 
 import numpy as np
 
+stl = config.lazyImport('stl') # numpy-stl, a non-standard package: pip install numpy-stl
+
 # ---------------------------------------------------------------------------
 # functions
 # ---------------------------------------------------------------------------
@@ -39,13 +39,500 @@ def array3D_BBox(a):
     
     return ((min(a[:,0]), min(a[:,1]), min(a[:,2])), (max(a[:,0]), max(a[:,1]), max(a[:,2])))
 
+def gridShape(bBox, cellSize):
+    """
+    grid dimensions (nx,ny,nz) of a lattice with cellSize, same rule as gridData()
+    """
+
+    return tuple(int((bBox[1][d]-bBox[0][d])/cellSize)+1 for d in range(3))
+
+def rayHits(vectors, nRays, chunk=2**22):
+    """
+    intersection of rays parallel to the last axis with triangles of shape (T, 3, 3)
+
+    - vectors are in ray coordinates, ray (a,b) passes through (a+0.5, b+0.5)
+    - nRays = (na, nb) rays in the first two axes
+    - points on shared edges and vertices are counted once (top-left rule)
+
+    returns (ray, z) with ray = a*nb+b and z the hit coordinate along the ray
+    """
+
+    x, y, z = vectors[:,:,0], vectors[:,:,1], vectors[:,:,2]
+
+    # signed area, drop triangles parallel to the rays, orient counter-clockwise
+    area = (x[:,1]-x[:,0])*(y[:,2]-y[:,0]) - (x[:,2]-x[:,0])*(y[:,1]-y[:,0])
+    keep = area!=0
+    x, y, z, area = x[keep], y[keep], z[keep], area[keep]
+    cw = area<0
+    x[cw], y[cw], z[cw] = x[cw][:,[0,2,1]], y[cw][:,[0,2,1]], z[cw][:,[0,2,1]]
+    area = np.abs(area)
+
+    # candidate rays from the projected bounding box of each triangle
+    a0 = np.clip(np.ceil(x.min(axis=1)-0.5), 0, nRays[0]).astype(np.int64)
+    a1 = np.clip(np.floor(x.max(axis=1)-0.5)+1, 0, nRays[0]).astype(np.int64)
+    b0 = np.clip(np.ceil(y.min(axis=1)-0.5), 0, nRays[1]).astype(np.int64)
+    b1 = np.clip(np.floor(y.max(axis=1)-0.5)+1, 0, nRays[1]).astype(np.int64)
+    na, nb = np.maximum(a1-a0,0), np.maximum(b1-b0,0)
+    count = na*nb
+
+    rays, hits = [], []
+    total = np.cumsum(count)
+    t0 = 0
+    while t0 < len(count):
+        # chunk of triangles with at most chunk candidate rays (at least one triangle)
+        t1 = max(int(np.searchsorted(total, (total[t0-1] if t0 else 0)+chunk, 'right')), t0+1)
+        t = np.arange(t0, t1)
+        t = np.repeat(t, count[t])
+        offset = np.arange(len(t)) - np.repeat(np.cumsum(count[t0:t1])-count[t0:t1], count[t0:t1])
+        a = a0[t] + offset % np.maximum(na[t],1)
+        b = b0[t] + offset // np.maximum(na[t],1)
+        px, py = a+0.5, b+0.5
+
+        # edge functions, w[i] is opposite to vertex i
+        tx, ty = x[t], y[t]
+        w, inside = [], np.ones(len(t), dtype=bool)
+        for i,j,k in ((0,1,2),(1,2,0),(2,0,1)):
+            dx, dy = tx[:,k]-tx[:,j], ty[:,k]-ty[:,j]
+            wi = dx*(py-ty[:,j]) - dy*(px-tx[:,j])
+            inside &= (wi>0) | ((wi==0) & ((dy<0) | ((dy==0) & (dx>0))))
+            w.append(wi)
+
+        tz = z[t]
+        zHit = (w[0]*tz[:,0] + w[1]*tz[:,1] + w[2]*tz[:,2]) / area[t]
+
+        rays.append((a*nRays[1]+b)[inside])
+        hits.append(zHit[inside])
+        t0 = t1
+
+    if len(rays):
+        return np.concatenate(rays), np.concatenate(hits)
+    return np.zeros(0, dtype=np.int64), np.zeros(0)
+
+def voxelizeVectors(vectors, origin, cellSize, shape, fraction=False, axis=2, samples=4):
+    """
+    rasterize a closed triangle mesh of shape (T, 3, 3) onto a regular lattice
+
+    - cell (i,j,k) spans origin + [i,i+1)*cellSize, same as gridData()
+    - scanline parity filling along axis, no per cell inside test
+    - fraction=False: bool occupancy of cell centres
+    - fraction=True: float32 volume fraction, samples x samples rays per cell
+      with exact interval lengths along the ray
+
+    returns np.array() of shape shape
+    """
+
+    perm = [d for d in range(3) if d!=axis] + [axis]
+    r = samples if fraction else 1
+    nu, nv, nw = shape[perm[0]], shape[perm[1]], shape[perm[2]]
+
+    # lattice (ray) coordinates
+    v = (np.asarray(vectors, dtype=np.float64)[:,:,perm] - np.asarray(origin, dtype=np.float64)[perm]) / cellSize
+    v[:,:,0:2] *= r
+
+    ray, zHit = rayHits(v, (nu*r, nv*r))
+
+    # sort hits along each ray, pair entry and exit crossings (parity)
+    order = np.lexsort((zHit, ray))
+    ray, zHit = ray[order], zHit[order]
+    first = np.flatnonzero(np.r_[True, ray[1:]!=ray[:-1]])
+    size = np.diff(np.r_[first, len(ray)])
+    rank = np.arange(len(ray)) - np.repeat(first, size)
+    entry = (rank%2==0) & (rank+1 < np.repeat(size, size))
+    e = np.flatnonzero(entry)
+    ray, u0, u1 = ray[e], np.clip(zHit[e], 0, nw), np.clip(zHit[e+1], 0, nw)
+
+    a, b = ray // (nv*r) // r, ray % (nv*r) // r # cell of each ray
+
+    if not fraction:
+        # cells with centre in [u0,u1), difference array along the ray
+        k0 = np.ceil(u0-0.5).astype(np.int64)
+        k1 = np.ceil(u1-0.5).astype(np.int64)
+        diff = np.zeros((nu,nv,nw+1), dtype=np.int8)
+        np.add.at(diff, (a,b,k0), 1)
+        np.add.at(diff, (a,b,k1), -1)
+        grid = np.cumsum(diff, axis=2, dtype=np.int8)[:,:,:nw] > 0
+    else:
+        # exact length inside each cell along the ray, averaged over r*r rays
+        keep = u1>u0
+        a, b, u0, u1 = a[keep], b[keep], u0[keep], u1[keep]
+        k0 = np.floor(u0).astype(np.int64)
+        k1 = np.floor(u1).astype(np.int64)
+        same = k0==k1
+        part = np.zeros((nu,nv,nw+1), dtype=np.float32)
+        diff = np.zeros((nu,nv,nw+1), dtype=np.int32)
+        np.add.at(part, (a[same],b[same],k0[same]), u1[same]-u0[same])
+        a, b, u0, u1, k0, k1 = a[~same], b[~same], u0[~same], u1[~same], k0[~same], k1[~same]
+        np.add.at(part, (a,b,k0), k0+1-u0)
+        np.add.at(part, (a,b,k1), u1-k1)
+        np.add.at(diff, (a,b,k0+1), 1)
+        np.add.at(diff, (a,b,k1), -1)
+        part += np.cumsum(diff, axis=2, dtype=np.int32)
+        del diff
+        grid = part[:,:,:nw] / (r*r)
+
+    return grid.transpose(np.argsort(perm))
+
+def triangleBoxOverlap(vectors, bBox):
+    """
+    separating axis test of triangles of shape (T, 3, 3) against bounding box
+    ((x0,y0,z0),(x1,y1,z1)), vectorized over all triangles
+
+    returns bool np.array() of shape (T,), True if triangle and box overlap
+    """
+
+    b0, b1 = np.asarray(bBox[0], dtype=np.float64), np.asarray(bBox[1], dtype=np.float64)
+    c, h = (b0+b1)/2, (b1-b0)/2
+    v = np.asarray(vectors, dtype=np.float64) - c
+
+    # box normals: triangle bounding box vs box
+    overlap = np.all((v.min(axis=1) <= h) & (v.max(axis=1) >= -h), axis=1)
+
+    # triangle normal
+    e = [v[:,1]-v[:,0], v[:,2]-v[:,1], v[:,0]-v[:,2]]
+    n = np.cross(e[0], e[1])
+    overlap &= np.abs(np.einsum('ij,ij->i', n, v[:,0])) <= np.abs(n) @ h
+
+    # cross products of box normals and triangle edges
+    for i in range(3):
+        for ej in e:
+            a = np.zeros_like(ej)          # unit_i x ej
+            a[:,(i+1)%3] = -ej[:,(i+2)%3]
+            a[:,(i+2)%3] = ej[:,(i+1)%3]
+            p = np.einsum('tij,tj->ti', v, a)
+            r = np.abs(a) @ h
+            overlap &= (p.min(axis=1) <= r) & (p.max(axis=1) >= -r)
+
+    return overlap
+
+def clusterVectors(vectors, cellSize, origin):
+    """
+    vertex clustering of triangles of shape (T, 3, 3) on a lattice with cellSize
+
+    - vertices in a cell are split by the dominant axis of their vertex normal,
+      opposite walls of features thinner than cellSize stay separate clusters
+    - cluster vertex placed by minimising the summed plane quadric error of its
+      triangles (regularised towards the mean, clipped to the cluster cell)
+    - triangles collapsed to a line or point and duplicates are removed
+
+    returns triangles of shape (T', 3, 3)
+    """
+
+    v = np.asarray(vectors, dtype=np.float64)
+    corners = v.reshape(-1,3)
+    ijk = np.floor((corners - origin) / cellSize).astype(np.int64)
+
+    # vertex normal (area weighted over shared vertices) -> one of 6 axis directions
+    _, vertex = np.unique(corners, axis=0, return_inverse=True)
+    vertex = vertex.reshape(-1)
+    faceNormal = np.repeat(np.cross(v[:,1]-v[:,0], v[:,2]-v[:,0]), 3, axis=0)
+    vertexNormal = np.stack([np.bincount(vertex, faceNormal[:,i]) for i in range(3)], axis=1)[vertex]
+    axis = np.argmax(np.abs(vertexNormal), axis=1)
+    side = 2*axis + (vertexNormal[np.arange(len(axis)), axis] > 0)
+
+    key = (ijk[:,0] << 43) | (ijk[:,1] << 23) | (ijk[:,2] << 3) | side
+    keys, cluster = np.unique(key, return_inverse=True)
+    cluster = cluster.reshape(-1)
+    n = len(keys)
+
+    # plane quadrics n n^T (area weighted), summed per cluster
+    normal = np.cross(v[:,1]-v[:,0], v[:,2]-v[:,0]) / 2
+    length = np.linalg.norm(normal, axis=1)
+    unit = normal / np.where(length>0, length, 1)[:,None]
+    d = -np.einsum('ij,ij->i', unit, v[:,0])
+    Q = np.einsum('i,ij,ik->ijk', length, unit, unit)
+    b = -(length*d)[:,None]*unit
+
+    tri = cluster.reshape(-1,3)
+    A = np.stack([np.bincount(cluster, np.repeat(Q[:,i//3,i%3],3), n) for i in range(9)], axis=1).reshape(n,3,3)
+    B = np.stack([np.bincount(cluster, np.repeat(b[:,i],3), n) for i in range(3)], axis=1)
+    count = np.bincount(cluster, minlength=n)
+    mean = np.stack([np.bincount(cluster, corners[:,i], n) for i in range(3)], axis=1) / count[:,None]
+
+    lam = 1e-3*np.trace(A, axis1=1, axis2=2)[:,None] + 1e-12
+    x = np.linalg.solve(A + lam[:,:,None]*np.eye(3), (B + lam*mean)[:,:,None])[:,:,0]
+
+    cell = np.stack(((keys >> 43), (keys >> 23) & (2**20-1), (keys >> 3) & (2**20-1)), axis=1)
+    lo = cell*cellSize + origin
+    x = np.clip(x, lo, lo+cellSize)
+
+    # remove collapsed triangles, coincident triangles of opposite orientation
+    # cancel (thin walls), remaining duplicates are kept once
+    keep = (tri[:,0]!=tri[:,1]) & (tri[:,1]!=tri[:,2]) & (tri[:,2]!=tri[:,0])
+    tri = tri[keep]
+    even = ((tri[:,0]<tri[:,1]).astype(int) + (tri[:,1]<tri[:,2]) + (tri[:,2]<tri[:,0])) == 2
+    _, first, group = np.unique(np.sort(tri, axis=1), axis=0, return_index=True, return_inverse=True)
+    net = np.bincount(group.reshape(-1), np.where(even, 1, -1), len(first))
+    first = first[net!=0]
+    tri = tri[np.sort(first)]
+    flip = net[group[np.sort(first)].reshape(-1)] * np.where(even[np.sort(first)], 1, -1) < 0
+    tri[flip] = tri[flip][:,[0,2,1]]
+
+    return x[tri]
+
+def decimateVectors(vectors, maxTriangles, iterations=16):
+    """
+    decimate triangles of shape (T, 3, 3) to at most maxTriangles by vertex clustering,
+    cluster cell size from surface area and refined by bisection on log(cellSize)
+
+    returns triangles of shape (T', 3, 3), T' <= maxTriangles
+    """
+
+    if maxTriangles < 1:
+        print ('Error: decimateVectors requires maxTriangles >= 1')
+        raise TypeError
+
+    v = np.asarray(vectors, dtype=np.float64)
+    if len(v) <= maxTriangles:
+        return v
+
+    corners = v.reshape(-1,3)
+    origin = corners.min(axis=0)
+    diag = np.linalg.norm(corners.max(axis=0) - origin)
+    area = np.linalg.norm(np.cross(v[:,1]-v[:,0], v[:,2]-v[:,0]), axis=1).sum() / 2
+
+    # ~2 triangles per cluster cell on a surface, triangles ~ cellSize^-2
+    lo, hi, best = 0.0, np.inf, None
+    cellSize = max(np.sqrt(2*area/maxTriangles), diag*1e-6)
+    for _ in range(iterations):
+        result = clusterVectors(v, cellSize, origin)
+        if len(result) <= maxTriangles:
+            hi, best = cellSize, result
+            if len(result) >= 0.85*maxTriangles or cellSize >= diag:
+                break
+        else:
+            lo = cellSize
+        step = cellSize*np.sqrt(max(len(result),1)/(0.95*maxTriangles))
+        cellSize = step if lo < step < hi else (np.sqrt(lo*hi) if lo and hi<np.inf else step)
+
+    if best is None:
+        best = clusterVectors(v, 2*diag, origin)
+    if len(best) > maxTriangles:
+        # budget below the single cell result, keep the largest triangles
+        size = np.linalg.norm(np.cross(best[:,1]-best[:,0], best[:,2]-best[:,0]), axis=1)
+        best = best[np.sort(np.argsort(-size, kind='stable')[:maxTriangles])]
+
+    return best
+
+def vectorsMesh(vectors):
+    """
+    stl.mesh.Mesh from triangles of shape (T, 3, 3)
+    """
+
+    data = np.zeros(len(vectors), dtype=stl.mesh.Mesh.dtype)
+    data['vectors'] = vectors
+    return stl.mesh.Mesh(data)
+
+def mortonKey(ijk, bits=10):
+    """
+    interleave bits of integer cell indices np.array() of shape (N, 3) to Morton keys
+    """
+
+    key = np.zeros(len(ijk), dtype=np.int64)
+    ijk = np.asarray(ijk, dtype=np.int64)
+    for b in range(bits):
+        for d in range(3):
+            key |= ((ijk[:,d] >> b) & 1) << (3*b+d)
+    return key
+
+def mortonIJK(key, bits=10):
+    """
+    integer cell indices np.array() of shape (N, 3) of Morton keys, inverse of mortonKey()
+    """
+
+    key = np.asarray(key, dtype=np.int64)
+    ijk = np.zeros((len(key),3), dtype=np.int64)
+    for b in range(bits):
+        for d in range(3):
+            ijk[:,d] |= ((key >> (3*b+d)) & 1) << b
+    return ijk
+
+def stlRecords(fileName):
+    """
+    memory map of the triangle records of a binary stl file, None for ASCII stl
+    """
+
+    with open(fileName, 'rb') as f:
+        header = f.read(84)
+    if len(header) < 84:
+        return None
+    n = int(np.frombuffer(header[80:84], dtype='<u4')[0])
+    if 84 + n*stl.mesh.Mesh.dtype.itemsize != os.path.getsize(fileName):
+        return None # ASCII (or truncated) file
+
+    return np.memmap(fileName, dtype=stl.mesh.Mesh.dtype, mode='r', offset=84, shape=(n,))
+
+# ---------------------------------------------------------------------------
+# class stlIndex() - spatial index of an stl file
+# ---------------------------------------------------------------------------
+
+stlIndexCache = {} # in-process cache {fileName: stlIndex}
+
+class stlIndex:
+
+    def __init__(self, fileName, blockSize=4096, cache=True):
+        """
+        constructor for stlIndex()
+
+        - triangles sorted by Morton key of their centroid, in blocks of blockSize
+        - per block bounding box, per file bounding box
+        - saved under config.cacheDir if cache=True and cacheDir is set (never next to
+          the stl file), keyed on path, file size, modification time and blockSize
+        """
+
+        self.fileName = fileName
+        self.blockSize = blockSize
+        self.stamp = (os.path.getsize(fileName), os.path.getmtime(fileName))
+        self.records = stlRecords(fileName)
+        self.stlMesh = None
+
+        if self.records is None: # ASCII stl, held in memory
+            self.stlMesh = stl.mesh.Mesh.from_file(fileName)
+
+        self.cacheFile = None
+        if cache and config.cacheDir is not None:
+            self.cacheFile = os.path.join(config.cacheDir, 'stlIndex-' + \
+                config.hashKey(os.path.abspath(fileName), self.stamp, blockSize) + '.npz')
+
+        if not (self.cacheFile and self.load()):
+            self.build()
+            if self.cacheFile:
+                self.save()
+
+    # ~def __init__(self, fileName, blockSize=4096, cache=True)
+
+    def __str__(self):
+        return f"stlIndex {self.fileName} {self.bBox} {len(self.order)} triangles in {len(self.blockBox)} blocks"
+
+    def vectors(self, ids=None):
+        """
+        method to return triangle vertices of shape (T, 3, 3) for triangle ids (default all)
+        """
+
+        source = self.stlMesh.data if self.records is None else self.records
+        if ids is None:
+            return np.asarray(source['vectors'])
+        return np.asarray(source['vectors'][ids])
+
+    @config.timed('stlIndex.build')
+    def build(self, chunk=2**20):
+        """
+        method to build the spatial index in chunks of the memory mapped file
+        """
+
+        n = len(self.records) if self.records is not None else len(self.stlMesh)
+        config.count('stlIndex.triangles indexed', n)
+
+        tMin, tMax = np.zeros((n,3), dtype=np.float32), np.zeros((n,3), dtype=np.float32)
+        for c in range(0, n, chunk):
+            v = self.vectors(np.s_[c:c+chunk])
+            tMin[c:c+chunk], tMax[c:c+chunk] = v.min(axis=1), v.max(axis=1)
+
+        if n:
+            self.bBox = (tuple(map(float, tMin.min(axis=0))), tuple(map(float, tMax.max(axis=0))))
+        else:
+            self.bBox = ((0.,0.,0.),(0.,0.,0.))
+
+        # Morton order of centroids on a 1024^3 lattice
+        b0, size = np.array(self.bBox[0]), np.array(self.bBox[1]) - np.array(self.bBox[0])
+        ijk = ((tMin+tMax)/2 - b0) / np.where(size>0, size, 1) * 1023
+        self.order = np.argsort(mortonKey(ijk.astype(np.int64)), kind='stable')
+        self.order = self.order.astype(np.uint32 if n < 2**32 else np.int64)
+
+        # block bounding boxes
+        self.start = np.arange(0, n, self.blockSize)
+        bMin = np.minimum.reduceat(tMin[self.order], self.start) if n else np.zeros((0,3))
+        bMax = np.maximum.reduceat(tMax[self.order], self.start) if n else np.zeros((0,3))
+        self.blockBox = np.stack((bMin, bMax), axis=1)
+
+        if config.verbose:
+            print (f"stlIndex {self.fileName} {n} triangles")
+
+    # ~build(self, chunk=2**20)
+
+    def load(self):
+        """
+        method to load the index saved under config.cacheDir, False if missing or outdated
+        """
+
+        try:
+            with np.load(self.cacheFile) as f:
+                if tuple(f['stamp'])!=self.stamp or int(f['blockSize'])!=self.blockSize:
+                    return False
+                self.bBox = tuple(map(tuple, f['bBox'].tolist()))
+                self.order, self.start, self.blockBox = f['order'], f['start'], f['blockBox']
+            os.utime(self.cacheFile) # least recently used eviction, see config.evict()
+        except (OSError, KeyError, ValueError):
+            return False
+
+        return True
+
+    # ~load(self)
+
+    def save(self):
+        """
+        method to save the index under config.cacheDir
+        """
+
+        try:
+            os.makedirs(config.cacheDir, exist_ok=True)
+            temp = f"{self.cacheFile}.{os.getpid()}.tmp.npz"
+            np.savez(temp, stamp=np.array(self.stamp), blockSize=self.blockSize, \
+                     bBox=np.array(self.bBox), order=self.order, start=self.start, blockBox=self.blockBox)
+            os.replace(temp, self.cacheFile) # atomic for concurrent writers
+            config.evict()
+        except OSError:
+            if config.verbose:
+                print (f"stlIndex: could not save {self.cacheFile}")
+
+    # ~save(self)
+
+    @config.timed('stlIndex.query')
+    def query(self, bBox, offset=0.0):
+        """
+        method to return sorted triangle ids overlapping bBox expanded by offset
+        """
+
+        ((x0,y0,z0),(x1,y1,z1)) = (bBox[0][0]-offset,bBox[0][1]-offset,bBox[0][2]-offset), \
+                                  (bBox[1][0]+offset,bBox[1][1]+offset,bBox[1][2]+offset)
+        lo, hi = np.array([x0,y0,z0]), np.array([x1,y1,z1])
+
+        blocks = np.flatnonzero(np.all((self.blockBox[:,0] <= hi) & (self.blockBox[:,1] >= lo), axis=1))
+        if len(blocks)==0:
+            return np.zeros(0, dtype=np.int64)
+
+        ids = np.sort(np.concatenate([self.order[s:s+self.blockSize] for s in self.start[blocks]]))
+        return ids[triangleBoxOverlap(self.vectors(ids), ((x0,y0,z0),(x1,y1,z1)))]
+
+    # ~query(self, bBox, offset=0.0)
+
+    def mesh(self, ids):
+        """
+        method to return stl.mesh.Mesh of triangle ids
+        """
+
+        source = self.stlMesh.data if self.records is None else self.records
+        return stl.mesh.Mesh(np.array(source[ids]), calculate_normals=False)
+
+def getIndex(fileName, blockSize=4096, cache=True):
+    """
+    stlIndex() of fileName from the in-process cache, (re)built if the file changed
+    """
+
+    key = os.path.abspath(fileName)
+    index = stlIndexCache.get(key)
+    if index is None or index.blockSize!=blockSize or \
+       index.stamp!=(os.path.getsize(fileName), os.path.getmtime(fileName)):
+        index = stlIndex(fileName, blockSize, cache)
+        stlIndexCache[key] = index
+    return index
+
 # ---------------------------------------------------------------------------
 # class stlGeom()
 # ---------------------------------------------------------------------------
 
 class stlGeom:
 
-    def __init__(self, fileName=None):
+    def __init__(self, fileName=None, lazy=False):
         """
         constructor for stlGeom()
         """
@@ -54,13 +541,15 @@ class stlGeom:
         self.pathName = None
         self.stlMesh = None
         self.bBox = None
+        self.files = [] # stl files read, source for clip() without mesh
+        self.lod = {}   # cached levels of detail {maxTriangles: stl.mesh.Mesh}
         
         if self.fileName==None:
             pass
         else:
-            self.read(self.fileName)
+            self.read(self.fileName, lazy)
 
-    # ~def __init__(self, fileName=None)
+    # ~def __init__(self, fileName=None, lazy=False)
 
     def __str__(self):
         if self.stlMesh:
@@ -68,26 +557,34 @@ class stlGeom:
                 return f"File {self.fileName} {self.bBox} {len(self.stlMesh)} triangles"
             elif self.pathName:
                 return f"Path {self.pathName} {self.bBox} {len(self.stlMesh)} triangles"
+        elif self.fileName:
+            return f"File {self.fileName} {self.bBox} no Mesh"
         else:
             return f"Path {self.pathName} {self.bBox} no Mesh"
 
-    def read(self, fileName):
+    @config.timed('stlGeom.read')
+    def read(self, fileName, lazy=False):
         """
         method to read stlGeom
+
+        lazy=True only reads the spatial index (stlIndex) for bBox and clip()
         """
 
         self.fileName=fileName
+        self.files=[fileName]
+        self.lod={}
 
-        t0 = time.time()
-        self.stlMesh = stl.mesh.Mesh.from_file(fileName)
-        
-        if config.verbose:
-            print (f"time: {time.time()-t0} seconds")
-            
-        self.minMax()
+        if lazy:
+            self.stlMesh = None
+            self.bBox = getIndex(fileName).bBox
+        else:
+            self.stlMesh = stl.mesh.Mesh.from_file(fileName)
+            self.minMax()
+            config.count('stlGeom.triangles read', len(self.stlMesh))
             
-    # ~read(self, fileName)
+    # ~read(self, fileName, lazy=False)
 
+    @config.timed('stlGeom.readPath')
     def readPath(self, pathName, recursive=True, combine=False):
         """
         walk path, combine stl files and determine bounding box
@@ -97,10 +594,10 @@ class stlGeom:
         self.stlMesh = None
         self.bBox = None
         self.pathName=pathName
+        self.files=[]
+        self.lod={}
         oldData=[]
 
-        t0 = time.time()
-
         for osFolder, osSubfolders, osFilenames in os.walk(pathName):
             if config.verbose:
                 print(f"Reading {osFolder}")
@@ -110,16 +607,19 @@ class stlGeom:
 
                 if os.path.splitext(osFilename)[1]=='.stl':
                     try:
-                        self.stlMesh=stl.mesh.Mesh.from_file(os.path.join(osFolder,osFilename))
+                        if combine:
+                            self.stlMesh=stl.mesh.Mesh.from_file(os.path.join(osFolder,osFilename))
+                            fileBox = self.stlMesh.min_, self.stlMesh.max_
+                        else: # bounding box from (cached) spatial index
+                            fileBox = getIndex(os.path.join(osFolder,osFilename)).bBox
+                        self.files.append(os.path.join(osFolder,osFilename))
                         if config.verbose: print(f"... success reading {osFilename}")
 
                         # update bounding box
                         if self.bBox:
-                            oldBox = self.bBox
-                            self.minMax()
-                            self.bBox = array3D_BBox(np.vstack((oldBox,self.bBox)))
+                            self.bBox = array3D_BBox(np.vstack((self.bBox,fileBox)))
                         else:
-                            self.minMax()
+                            self.bBox = tuple(map(tuple,fileBox))
 
                         # combine meshes
                         if combine and len(oldData) and self.bBox:
@@ -136,7 +636,6 @@ class stlGeom:
             self.stlMesh = None
         
         if config.verbose:
-            print (f"time: {time.time()-t0} seconds")
             print (self.bBox)
 
     # ~readPath(self, fileName)
@@ -151,6 +650,118 @@ class stlGeom:
 
     # ~minMax(self)
 
+    @config.timed('stlGeom.clip')
+    def clip(self, bBox, offset=0.0):
+        """
+        method to clip stlGeom to triangles overlapping bBox expanded by offset
+
+        - mesh in memory: vectorized triangle-box overlap test
+        - no mesh (lazy read, readPath with combine=False): only triangles in
+          spatial index blocks near bBox are read from self.files
+
+        returns new stlGeom() with clipped mesh
+        """
+
+        ((x0,y0,z0),(x1,y1,z1)) = (bBox[0][0]-offset,bBox[0][1]-offset,bBox[0][2]-offset), \
+                                  (bBox[1][0]+offset,bBox[1][1]+offset,bBox[1][2]+offset)
+        box = ((x0,y0,z0),(x1,y1,z1))
+
+        clipped = stlGeom()
+        clipped.fileName, clipped.pathName = self.fileName, self.pathName
+
+        if self.stlMesh is not None:
+            data = self.stlMesh.data[triangleBoxOverlap(self.stlMesh.vectors, box)]
+        else:
+            data = []
+            for fileName in self.files:
+                index = getIndex(fileName)
+                fBox = index.bBox
+                if all(fBox[0][d] <= box[1][d] and fBox[1][d] >= box[0][d] for d in range(3)):
+                    data.append(index.mesh(index.query(box)).data)
+            data = np.concatenate(data) if data else np.zeros(0, dtype=stl.mesh.Mesh.dtype)
+
+        if len(data):
+            clipped.stlMesh = stl.mesh.Mesh(data.copy(), calculate_normals=False)
+            clipped.minMax()
+
+        if config.verbose:
+            print (f"clip {bBox} offset {offset}: {len(data)} triangles")
+
+        return clipped
+
+    # ~clip(self, bBox, offset=0.0)
+
+    @config.timed('stlGeom.decimate')
+    def decimate(self, maxTriangles):
+        """
+        method to return a level of detail with at most maxTriangles
+
+        - decimated to the budget itself (vertex clustering, quadric error placement)
+        - levels are cached in self.lod by budget, the full mesh is returned if within budget
+
+        returns stl.mesh.Mesh
+        """
+
+        if self.stlMesh is None:
+            print ('Error: decimate requires a mesh')
+            raise TypeError
+
+        if maxTriangles < 1:
+            print ('Error: decimate requires maxTriangles >= 1')
+            raise TypeError
+
+        n = len(self.stlMesh)
+        if n <= maxTriangles:
+            return self.stlMesh
+
+        maxTriangles = int(maxTriangles)
+        if maxTriangles not in self.lod:
+            self.lod[maxTriangles] = vectorsMesh(decimateVectors(self.stlMesh.vectors, maxTriangles))
+            if config.verbose:
+                print (f"decimate to {maxTriangles}: {n} -> {len(self.lod[maxTriangles])} triangles")
+
+        return self.lod[maxTriangles]
+
+    # ~decimate(self, maxTriangles)
+
+    @config.timed('stlGeom.voxelize')
+    def voxelize(self, grid=None, cellSize=None, bBox=None, fraction=False, axis=2, samples=4):
+        """
+        method to rasterize the (closed) stl mesh onto a gridData lattice
+
+        arguments:
+        -grid:          gridData object, provides cellSize, bBox and shape
+        -cellSize:      edge length of grid cell if grid is None
+        -bBox:          lattice bounding box if grid is None, default self.bBox
+        -fraction:      False: bool occupancy, True: float32 volume fraction
+        -axis:          scanline axis 0,1,2 = x,y,z
+        -samples:       rays per cell and axis for fraction=True
+
+        returns np.array() of shape (nx,ny,nz), cell centres via gridData.cellCentres()
+        """
+
+        if self.stlMesh is None:
+            print ('Error: voxelize requires a mesh')
+            raise TypeError
+
+        if grid is not None:
+            cellSize, bBox, shape = grid.cellSize, grid.bBox, grid.shape
+        else:
+            if cellSize is None:
+                print ('Error: voxelize requires grid or cellSize')
+                raise TypeError
+            if bBox is None:
+                bBox = self.bBox
+            shape = gridShape(bBox, cellSize)
+
+        voxels = voxelizeVectors(self.stlMesh.vectors, bBox[0], cellSize, shape, \
+                                 fraction=fraction, axis=axis, samples=samples)
+        config.count('stlGeom.cells voxelized', voxels.size)
+
+        return voxels
+
+    # ~voxelize(self, grid=None, cellSize=None, bBox=None, fraction=False)
+
     def write(self, fileName, mode='ASCII'):
         """
         write stlGeom to file
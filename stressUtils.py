@@ -22,6 +22,8 @@ If not, see <https://www.gnu.org/licenses/>.
 import numpy as np
 import math
 
+import config
+
 def rot_x(theta):
     """
     3D rotation matrix theta, positive (right hand rule) around x axis
@@ -117,4 +119,30 @@ def getPlaneOrientation(normal):
     dip = math.degrees(math.acos(normal[2]*sign))
     ddir = (math.degrees(math.atan2(normal[0]*sign,normal[1]*sign))+360)%360
 
-    return (dip,ddir)
\ No newline at end of file
+    return (dip,ddir)
+
+def getPlaneNormal(dip, ddir):
+    """
+    returns upward unit normal vector for dip and direction, inverse of getPlaneOrientation()
+    """
+
+    dip, ddir = math.radians(dip), math.radians(ddir)
+    return np.array([math.sin(dip)*math.sin(ddir), math.sin(dip)*math.cos(ddir), math.cos(dip)])
+
+def stressInvariants(stress):
+    """
+    bulk invariants of packed stress np.array() of shape (N, 6) [Sxx,Syy,Szz,Sxy,Sxz,Syz]
+    in config.floatType(), from the deviator so that float32 keeps about eps |S| accuracy
+
+    returns I1 (trace), J2 and J3 of the deviatoric stress, each (N,)
+    """
+
+    s = np.asarray(stress, dtype=config.floatType())
+    I1 = s[:,0] + s[:,1] + s[:,2]
+    dx, dy, dz = s[:,0] - I1/3, s[:,1] - I1/3, s[:,2] - I1/3
+    sxy, sxz, syz = s[:,3], s[:,4], s[:,5]
+
+    J2 = (dx*dx + dy*dy + dz*dz)/2 + sxy*sxy + sxz*sxz + syz*syz
+    J3 = dx*dy*dz + 2*sxy*sxz*syz - dx*syz*syz - dy*sxz*sxz - dz*sxy*sxy
+
+    return I1, J2, J3
@@ -19,12 +19,15 @@ If not, see <https://www.gnu.org/licenses/>.
 # imports
 # ---------------------------------------------------------------------------
 
-import time
+import os
 import csv
+import locale
 import config
 
 import numpy as np
-from scipy.spatial import KDTree
+
+from stressUtils import getPlaneNormal
+from stlGeom import mortonKey
 
 # ---------------------------------------------------------------------------
 # functions
@@ -39,9 +42,12 @@ def array3D_BBox(a):
     
     return ((min(a[:,0]), min(a[:,1]), min(a[:,2])), (max(a[:,0]), max(a[:,1]), max(a[:,2])))
 
-def array3D_IPR(a, p_IPR=25.0):
+def array3D_IPR(a, p_IPR=25.0, mask=False, limits=False):
     """
     filter in interpercentile range of np.array() of shape (N, 3 or more)
+
+    mask=True returns the boolean row mask instead of the filtered array
+    limits=True also returns the percentile limits ((x0,x1),(y0,y1),(z0,z1))
     """
     
     xyz_pmin, xyz_pmax = p_IPR, 100 - p_IPR # symmetric interpercentile range
@@ -51,10 +57,275 @@ def array3D_IPR(a, p_IPR=25.0):
         (np.percentile(a[:,1],xyz_pmin), np.percentile(a[:,1],xyz_pmax)), \
         (np.percentile(a[:,2],xyz_pmin), np.percentile(a[:,2],xyz_pmax)))
         
-    return a[( \
+    inside = ( \
         (a[:,0] > p_limits[0][0]) & (a[:,0] < p_limits[0][1]) & \
         (a[:,1] > p_limits[1][0]) & (a[:,1] < p_limits[1][1]) & \
-        (a[:,2] > p_limits[2][0]) & (a[:,2] < p_limits[2][1]) )]
+        (a[:,2] > p_limits[2][0]) & (a[:,2] < p_limits[2][1]) )
+
+    result = inside if mask else a[inside]
+    return (result, p_limits) if limits else result
+
+def parseTime(dates, invalid=False):
+    """
+    parse date strings (ISO 8601, e.g. 2024-01-01T10:00:00 or 2024-01-01 10:00) to int64 epoch ns
+
+    empty, nan and unparsable entries become NaT (np.iinfo(np.int64).min),
+    invalid=True returns (time, number of non-empty entries that could not be parsed)
+    """
+
+    dates = np.asarray(dates, dtype=str)
+    empty = np.isin(np.char.lower(np.char.strip(dates)), ['', 'nan', 'none', 'null', 'nat'])
+    dates = np.where(empty, 'NaT', dates)
+    try:
+        t = dates.astype('datetime64[ns]')
+    except ValueError: # mixed or invalid entries
+        t = np.empty(len(dates), dtype='datetime64[ns]')
+        for i, d in enumerate(dates):
+            try:
+                t[i] = np.datetime64(d, 'ns')
+            except ValueError:
+                t[i] = np.datetime64('NaT')
+
+    t = t.view(np.int64)
+    return (t, int(np.count_nonzero((t==np.iinfo(np.int64).min) & ~empty))) if invalid else t
+
+def array3D_Keys(a, tol, lo=None, dims=None):
+    """
+    integer keys of x,y,z quantized to tol for np.array() of shape (N, 3 or more)
+
+    - mixed radix int64 over the box lo, lo+dims (default: bounding box of a) if it fits,
+      rows outside the box get key -1
+    - else the raw bytes of the quantized x,y,z (np.void), equal for equal nodes
+
+    returns keys, lo, dims
+    """
+
+    q = np.rint(a[:,0:3]/tol).astype(np.int64)
+    if lo is None:
+        lo = q.min(axis=0)
+        dims = q.max(axis=0) - lo + 1
+    if np.prod(dims.astype(np.float64)) >= 2.0**62:
+        return np.ascontiguousarray(q).view(np.dtype((np.void, 24))).ravel(), lo, dims
+
+    q -= lo
+    inside = np.all((q >= 0) & (q < dims), axis=1)
+    keys = (q[:,0]*dims[1] + q[:,1])*dims[2] + q[:,2]
+    keys[~inside] = -1
+
+    return keys, lo, dims
+
+def toTime(t):
+    """
+    int64 epoch ns of t: None, int (ns), str or np.datetime64
+    """
+
+    if t is None or isinstance(t, (int, np.integer)):
+        return t
+    return np.datetime64(t, 'ns').astype(np.int64)
+
+def appendRows(buffer, a, b):
+    """
+    rows b appended to np.array() a, with a a view of the first rows of buffer (or not),
+    buffer grows by doubling so that repeated appends copy each row O(1) times
+
+    returns buffer and the view of its first len(a)+len(b) rows
+    """
+
+    n = len(a) + len(b)
+    if buffer is None or a.base is not buffer or len(buffer) < n or buffer.shape[1:]!=a.shape[1:]:
+        grown = np.empty((max(2*n, 1024),) + a.shape[1:], dtype=a.dtype)
+        grown[:len(a)] = a
+        buffer = grown
+    buffer[len(a):n] = b
+    return buffer, buffer[:n]
+
+def csvLines(f, state):
+    """
+    decoded complete lines of binary file f for csv.reader(), state['offset'] is advanced
+    by the bytes of each line read, a last line without newline (complete, or still being
+    written) is kept in state['partial'] with the offset at its start
+    """
+
+    for line in f:
+        if not line.endswith(b'\n'):
+            state['partial'] = line
+            break
+        state['offset'] += len(line)
+        yield line.decode(state['encoding'])
+
+def array3D_Lattice(a, sample=10000):
+    """
+    regular lattice of np.array() of shape (N, 3 or more), None if x,y,z are scattered
+
+    - unique sorted coordinates per axis with constant spacing
+    - every lattice node present exactly once
+
+    returns xyzLattice()
+    """
+
+    if len(a) < 2 or a.ndim != 2:
+        return None
+
+    # quick reject: a sample of scattered points has all coordinates distinct
+    s = a[:sample,0:3]
+    if len(s)==sample and all(len(np.unique(s[:,d]))==sample for d in range(3)):
+        return None
+
+    axes = [np.unique(a[:,d]) for d in range(3)]
+    shape = tuple(len(u) for u in axes)
+    if shape[0]*shape[1]*shape[2] != len(a) or not np.all(np.isfinite(a[:,0:3])):
+        return None
+
+    origin, spacing = np.array([u[0] for u in axes]), np.ones(3)
+    for d, u in enumerate(axes):
+        if len(u) > 1:
+            spacing[d] = (u[-1]-u[0])/(len(u)-1)
+            if not np.allclose(np.diff(u), spacing[d], rtol=1e-6, atol=0):
+                return None
+
+    ijk = np.rint((a[:,0:3]-origin)/spacing).astype(np.int64)
+    flat = np.ravel_multi_index(ijk.T, shape)
+    order = np.argsort(flat, kind='stable')
+    if np.any(flat[order] != np.arange(len(a))): # missing or duplicate nodes
+        return None
+
+    if np.all(order[1:] > order[:-1]): # already in (nx,ny,nz) order, no copy
+        values = a.reshape(shape + (a.shape[1],))
+    else:
+        values = a[order].reshape(shape + (a.shape[1],))
+
+    return xyzLattice(origin, spacing, values)
+
+# ---------------------------------------------------------------------------
+# class xyzLattice()
+# ---------------------------------------------------------------------------
+
+class xyzLattice:
+
+    def __init__(self, origin, spacing, values):
+        """
+        constructor for xyzLattice()
+
+        regular lattice of nodes origin + (i,j,k)*spacing with all columns of the
+        source array stored dense in values of shape (nx,ny,nz,ncol)
+        """
+
+        self.origin = np.asarray(origin, dtype=np.float64)
+        self.spacing = np.asarray(spacing, dtype=np.float64)
+        self.values = values
+        self.shape = values.shape[0:3]
+
+    # ~def __init__(self, origin, spacing, values)
+
+    def __str__(self):
+        return f"xyzLattice {self.shape} origin {tuple(self.origin)} spacing {tuple(self.spacing)}"
+
+    def nearest(self, points):
+        """
+        method to return nearest node indices (N, 3) and distance (N,) for points of shape (N, 3)
+        """
+
+        u = (points[:,0:3]-self.origin)/self.spacing
+        ijk = np.clip(np.rint(u), 0, np.array(self.shape)-1).astype(np.int64)
+        dist = np.linalg.norm(points[:,0:3] - (self.origin + ijk*self.spacing), axis=1)
+        return ijk, dist
+
+    def interpolate(self, points, cols=None, linear=True, chunk=2**20):
+        """
+        method to interpolate columns cols (default all) at points of shape (N, 3 or more)
+
+        - linear=True: trilinear, points outside the lattice are clamped to its faces
+        - linear=False: nearest node
+
+        returns np.array() of shape (N, len(cols)) and distance to the nearest node (N,)
+        """
+
+        cols = np.arange(self.values.shape[3]) if cols is None else np.asarray(cols)
+        n = np.array(self.shape)
+        result = np.empty((len(points), len(cols)))
+        dist = np.empty(len(points))
+
+        for c in range(0, len(points), chunk):
+            p = points[c:c+chunk,0:3]
+            ijk, dist[c:c+chunk] = self.nearest(p)
+
+            if not linear:
+                result[c:c+chunk] = self.values[ijk[:,0],ijk[:,1],ijk[:,2]][:,cols]
+                continue
+
+            u = np.clip((p-self.origin)/self.spacing, 0, n-1)
+            i0 = np.minimum(np.floor(u).astype(np.int64), np.maximum(n-2,0))
+            w = u - i0
+            i1 = np.minimum(i0+1, n-1)
+
+            r = np.zeros((len(p), len(cols)))
+            for dx in (0,1):
+                wx = w[:,0] if dx else 1-w[:,0]
+                ix = i1[:,0] if dx else i0[:,0]
+                for dy in (0,1):
+                    wy = w[:,1] if dy else 1-w[:,1]
+                    iy = i1[:,1] if dy else i0[:,1]
+                    for dz in (0,1):
+                        wz = w[:,2] if dz else 1-w[:,2]
+                        iz = i1[:,2] if dz else i0[:,2]
+                        r += (wx*wy*wz)[:,None] * self.values[ix,iy,iz][:,cols]
+            result[c:c+chunk] = r
+
+        config.count('xyzLattice.points interpolated', len(points))
+        return result, dist
+
+    # ~def interpolate(self, points, cols=None, linear=True)
+
+# ---------------------------------------------------------------------------
+# sampling geometry
+# ---------------------------------------------------------------------------
+
+def planePoints(centre, dip, ddir, width, height, resolution):
+    """
+    regular points on a plane through centre with dip and direction (as getPlaneOrientation())
+
+    - u along strike (ddir-90), v up-dip, both centred on centre
+    - vertical section: dip=90, horizontal plan: dip=0
+
+    returns u (nu,), v (nv,) and points np.array() of shape (nv, nu, 3)
+    """
+
+    normal = getPlaneNormal(dip, ddir)
+    ddir = np.radians(ddir)
+    strike = np.array([-np.cos(ddir), np.sin(ddir), 0.0])
+    upDip = np.cross(normal, strike)
+
+    u = np.arange(-width/2, width/2 + resolution/2, resolution)
+    v = np.arange(-height/2, height/2 + resolution/2, resolution)
+    points = np.asarray(centre, dtype=np.float64) + u[None,:,None]*strike + v[:,None,None]*upDip
+
+    return u, v, points
+
+def linePoints(polyline, resolution):
+    """
+    points every resolution along polyline np.array() of shape (M, 3), vertices included
+
+    returns chainage (N,) and points np.array() of shape (N, 3)
+    """
+
+    polyline = np.asarray(polyline, dtype=np.float64)
+    segment = np.linalg.norm(np.diff(polyline, axis=0), axis=1)
+    vertex = np.concatenate([[0.0], np.cumsum(segment)])
+
+    chainage = np.union1d(np.arange(0.0, vertex[-1], resolution), vertex)
+    points = np.column_stack([np.interp(chainage, vertex, polyline[:,d]) for d in range(3)])
+
+    return chainage, points
+
+def boxPoints(bBox, resolution):
+    """
+    regular points every resolution in bounding box ((x0,y0,z0),(x1,y1,z1))
+
+    returns points np.array() of shape (nx, ny, nz, 3)
+    """
+
+    axes = [np.arange(bBox[0][d], bBox[1][d] + resolution/2, resolution) for d in range(3)]
+    return np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1)
 
 # ---------------------------------------------------------------------------
 # class xyzData()
@@ -62,7 +333,7 @@ def array3D_IPR(a, p_IPR=25.0):
 
 class xyzData:
 
-    def __init__(self, fileName=None):
+    def __init__(self, fileName=None, nodes=None, columns=None, bBox=None):
         """
         constructor for xyzData()
         """
@@ -72,6 +343,15 @@ class xyzData:
         self.pData=[]   # raw data set, np.array()
         self.current=[] # current data set (filtered), np.array()
         self.bBox=[]    # current data bounding box
+        self.lattice=None # xyzLattice() of self.pData if x,y,z form a regular lattice
+        self.tree=None  # (current, KDTree) cached by kdTree()
+
+        self.rows=None  # row indices of self.current in self.pData
+        self.time=None  # int64 epoch ns of 'date' per row of self.pData, NaT if missing
+        self.timeIndex=None # (current, order, sorted times) cached by timeSorted()
+        self.nodeIndex=None # (current, tol, lo, dims, sorted keys, order) cached by join()
+        self.filters=[] # filters applied since setData() [(name, arguments)], reapplied by tail()
+        self.tailState=None # csv header mapping, byte offset and row buffers of read(), see tail()
 
         self.index = {'x':0,'y':1,'z':2} # index storing self.pData
         
@@ -87,116 +367,545 @@ class xyzData:
         if self.fileName==None:
             pass
         else:
-            self.read(self.fileName)
+            self.read(self.fileName, nodes, columns=columns, bBox=bBox)
 
     # ~def __init__(self, fileName=None)
 
     def __str__(self):
         return f"{self.fileName}, {len(self.pData)} Lines, {len(self.current)} current Points"
 
-    def read(self, fileName):
+    @config.timed('xyzData.read')
+    def read(self, fileName, nodes=None, check=1000, columns=None, bBox=None):
         """
-        method to read xyzData
+        method to read xyzData from csv, Parquet (.parquet) or HDF5 (.h5) written by write()
+
+        nodes: xyzData with the same nodes in the same line order (e.g. the first stage of a
+        model), x,y,z are taken from nodes.pData and only parsed every check lines to verify
+        columns: index names to read (default all), x,y,z are always read
+        bBox: keep rows in ((x0,y0,z0),(x1,y1,z1)), Parquet and HDF5 skip chunks outside
         """
 
         self.fileName=fileName
         self.maxCol = 0
+
+        ext = os.path.splitext(fileName)[1].lower()
+        if ext in ['.parquet','.pq']:
+            return self.readParquet(fileName, columns, bBox)
+        if ext in ['.h5','.hdf5']:
+            return self.readHDF5(fileName, columns, bBox)
         
-        t0 = time.time()
-        with open(fileName, newline='') as csvfile:
-            csv_reader = csv.reader(csvfile, delimiter=',', quotechar='"') # defaults
+        state = {'fileName': fileName, 'offset': 0, 'line': 0, 'bBox': bBox, 'buffers': {}, \
+                 'encoding': locale.getpreferredencoding(False)}
+
+        with open(fileName, 'rb') as csvfile:
+            csv_reader = csv.reader(csvLines(csvfile, state), delimiter=',', quotechar='"') # defaults
     
-            i,k = 0,0 # i: line counter, k: invalid lines
+            k = 0 # invalid lines
+            dpos, dates = None, [] # date column, date strings of valid lines
             
-            for row in csv_reader:
-                if i==0: # headers
-                    if config.verbose: print ("reading column headers ...")
-
-                    # listed headers, save j in dictionary & update maxCol
-                    j=0
-                    for csv_col_head in row:
-                        # current column is j
-                        csv_col = csv_col_head.lower() 
-                        if csv_col in self.index.keys():
-                            self.csvCol[csv_col]=j
-                            self.maxCol=max(self.maxCol,self.index[csv_col])
-
-                            if config.verbose:
-                                print (csv_col, "listed in column", self.csvCol[csv_col], \
-                                       "stored in", self.index[csv_col] )
-                        j+=1
-
-                    # unlisted headers, locate next available slot
-                    listed=[]
-                    for j in self.index: listed.append(self.index[j])
-                    nextIndex = list(range(len(row)))
-                    for j in listed: nextIndex.remove(j)
-                    nextIndex.sort()
-
-                    j=0                    
-                    for csv_col_head in row:
-                        csv_col = csv_col_head.lower() 
-                        if csv_col not in self.exclude:
-                            self.csvCol[csv_col]=j
-                            self.index[csv_col]=nextIndex[0] # next available slot
-                            self.maxCol=max(self.maxCol,self.index[csv_col])
-                            nextIndex.remove(nextIndex[0])
-
-                            if config.verbose:
-                                print (csv_col, "unlisted in column", self.csvCol[csv_col], \
-                                       "stored in", self.index[csv_col] )
-                        j+=1
-                        
-                    # avoid repeat lookup
-                    xpos = self.csvCol['x']
-                    ypos = self.csvCol['y']
-                    zpos = self.csvCol['z']
-                    
-                elif i>0: # read data
-                    valid = True
-
-                    try:
-                        # x,y,z are required for valid line
-                        x=float(row[xpos])
-                        y=float(row[ypos])
-                        z=float(row[zpos])
-                    except:
-                        valid = False
-                        k+=1
-                    
-                    # row template with np.nan for missing data
-                    rowData=[x,y,z]+[np.nan]*(self.maxCol-2)
+            for row in csv_reader: # headers
+                if config.verbose: print ("reading column headers ...")
+
+                # listed headers, save j in dictionary & update maxCol
+                j=0
+                for csv_col_head in row:
+                    # current column is j
+                    csv_col = csv_col_head.lower() 
+                    if csv_col in self.index.keys():
+                        self.csvCol[csv_col]=j
+                        self.maxCol=max(self.maxCol,self.index[csv_col])
+
+                        if config.verbose:
+                            print (csv_col, "listed in column", self.csvCol[csv_col], \
+                                   "stored in", self.index[csv_col] )
+                    j+=1
+
+                # unlisted headers, locate next available slot
+                listed=[]
+                for j in self.index: listed.append(self.index[j])
+                nextIndex = list(range(len(row)))
+                for j in listed: nextIndex.remove(j)
+                nextIndex.sort()
+
+                j=0                    
+                for csv_col_head in row:
+                    csv_col = csv_col_head.lower() 
+                    if csv_col not in self.exclude and (columns is None or csv_col in columns):
+                        self.csvCol[csv_col]=j
+                        self.index[csv_col]=nextIndex[0] # next available slot
+                        self.maxCol=max(self.maxCol,self.index[csv_col])
+                        nextIndex.remove(nextIndex[0])
+
+                        if config.verbose:
+                            print (csv_col, "unlisted in column", self.csvCol[csv_col], \
+                                   "stored in", self.index[csv_col] )
+                    j+=1
                     
-                    for csv_col in self.csvCol:
-                        if csv_col not in ['x','y','z','id','date']:
-                            j = self.csvCol[csv_col] # column index
-                            try:
-                                rowData[self.index[csv_col]]=float(row[j])
-                            except:
-                                pass
-
-                    if valid:
-                        self.pData.append(np.array(rowData))
-                i+=1
+                # avoid repeat lookup, kept for tail()
+                # date is kept out of pData, parsed into self.time
+                header = [h.lower() for h in row]
+                dpos = header.index('date') if 'date' in header else None
+                state.update({'line': 1, 'xpos': self.csvCol['x'], 'ypos': self.csvCol['y'], \
+                              'zpos': self.csvCol['z'], 'dpos': dpos, 'width': self.maxCol+1, \
+                              'readDate': dpos is not None and (columns is None or 'date' in columns), \
+                              'targets': [(self.csvCol[c], self.index[c]) for c in self.csvCol \
+                                          if c not in ['x','y','z','id','date']]})
+                break
+
+            if state['line']: # read data
+                self.pData, dates, k = self.parseRows(csv_reader, state, nodes, check)
+
+                # last line without newline: parsed, tail() replaces it if it was incomplete
+                if state.get('partial') is not None:
+                    rows, partialDates, partialInvalid = self.parseRows( \
+                        csv.reader([state['partial'].decode(state['encoding'])]), state, nodes, check)
+                    self.pData += rows
+                    dates += partialDates
+                    k += partialInvalid
+                    state['partialRow'] = rows[0] if rows else None
+        i = state['line']
+
+        config.count('xyzData.rows parsed', max(i-1,0))
+        config.count('xyzData.invalid lines', k)
 
         if config.verbose:
-            print (f"time: {time.time()-t0} seconds")
             print (f"{i} Lines, {self.maxCol+1} columns")
             print (f"invalid data in {k} lines")
             
         self.pData = np.vstack(self.pData)
+        if nodes is not None and len(self.pData)!=len(nodes.pData):
+            print (f'Error: {len(self.pData)} lines in {fileName}, {len(nodes.pData)} nodes in {nodes.fileName}')
+            raise TypeError
 
-        self.current = self.pData
-        self.bBox = array3D_BBox(self.current)
+        time = None
+        if dpos is not None and (columns is None or 'date' in columns):
+            with config.span('xyzData.read parseTime'):
+                time, invalidDates = parseTime(dates, invalid=True)
+            config.count('xyzData.dates parsed', len(dates))
+            config.count('xyzData.invalid dates', invalidDates)
+            if config.verbose:
+                print (f"invalid date in {invalidDates} lines (ISO 8601 expected)")
+
+        self.setData(self.pData, self.index, time, bBox)
+        self.tailState = state
             
-    # ~read(self, fileName)
+    # ~read(self, fileName, nodes=None)
+
+    def parseRows(self, csv_reader, state, nodes=None, check=1000):
+        """
+        method to parse csv data rows with the header mapping of read() in state,
+        state['line'] is the line number of the first row and is advanced
+
+        returns list of row np.array(), date strings of valid rows and number of invalid lines
+        """
+
+        xpos, ypos, zpos, dpos = state['xpos'], state['ypos'], state['zpos'], state['dpos']
+        targets, width, fileName = state['targets'], state['width'], state['fileName']
+        i, k = state['line'], 0
+        pData, dates = [], []
+
+        for row in csv_reader:
+            valid = True
+
+            if nodes is not None and (i-1)%check!=0 and i<=len(nodes.pData): # known nodes
+                x,y,z = nodes.pData[i-1,0:3]
+            else:
+                try:
+                    # x,y,z are required for valid line
+                    x=float(row[xpos])
+                    y=float(row[ypos])
+                    z=float(row[zpos])
+                except:
+                    valid = False
+                    k+=1
+
+                if nodes is not None and (i>len(nodes.pData) or not valid or \
+                                          np.any(nodes.pData[i-1,0:3] != (x,y,z))):
+                    print (f'Error: line {i} of {fileName} does not match nodes {nodes.fileName}')
+                    raise TypeError
+
+                if not valid: # no x,y,z
+                    i+=1
+                    continue
+            
+            # row template with np.nan for missing data
+            rowData=[x,y,z]+[np.nan]*(width-3)
+            
+            for j, col in targets:
+                try:
+                    rowData[col]=float(row[j])
+                except:
+                    pass
+
+            pData.append(np.array(rowData))
+            if dpos is not None:
+                dates.append(row[dpos] if dpos < len(row) else '')
+            i+=1
+
+        state['line'] = i
+        return pData, dates, k
+
+    # ~def parseRows()
+
+    @config.timed('xyzData.tail')
+    def tail(self):
+        """
+        method to read rows appended to the csv file since read() or the last tail()
+
+        - only complete lines after the byte offset of the last read are parsed,
+          with the header mapping of read(), lines without x,y,z are skipped
+        - rows are appended to self.pData (and self.time) with amortised growth, and to
+          self.current and self.rows if they pass self.filters (filterIPR with its limits),
+          columns of self.current not in self.pData (mapData()) are nan for new rows
+        - the time index of timeSorted() is extended if the new rows are in time order,
+          kdTree() and join() indices are rebuilt on their next use
+
+        returns number of new rows in self.current
+        """
+
+        state = self.tailState
+        if state is None:
+            print ('Error: tail() requires a csv file read by read()')
+            raise TypeError
+
+        fileName = state['fileName']
+        size = os.path.getsize(fileName)
+        if size < state['offset']:
+            print (f'Error: {fileName} is shorter than at the last read, read() it again')
+            raise TypeError
+
+        with open(fileName, 'rb') as f:
+            f.seek(state['offset'])
+            block = f.read(size - state['offset'])
+        block = block[:block.rfind(b'\n')+1] # complete lines only
+        if not block:
+            return 0
+
+        # last line of read() without newline: skip if it was complete, else replace its row
+        partial = state.pop('partial', None)
+        if partial is not None:
+            first = block[:block.find(b'\n')+1]
+            if first.rstrip(b'\r\n')==partial.rstrip(b'\r'):
+                state['offset'] += len(first)
+                block = block[len(first):]
+            else:
+                self.dropLastRow(state.pop('partialRow', None))
+                state['line'] -= 1
+            state.pop('partialRow', None)
+            if not block:
+                return 0
+
+        lines = block.decode(state['encoding']).splitlines(keepends=True)
+        rows, dates, k = self.parseRows(csv.reader(lines, delimiter=',', quotechar='"'), state)
+        state['offset'] += len(block) # after parsing succeeded
+        config.count('xyzData.rows tailed', len(lines))
+        config.count('xyzData.invalid lines', k)
+        if not rows:
+            return 0
+
+        new = np.vstack(rows)
+        time = None
+        if state['readDate']:
+            time, invalidDates = parseTime(dates, invalid=True)
+            config.count('xyzData.invalid dates', invalidDates)
+            if config.verbose and invalidDates:
+                print (f"invalid date in {invalidDates} tailed lines (ISO 8601 expected)")
+        if state['bBox'] is not None:
+            inside = np.all((new[:,0:3] >= np.array(state['bBox'][0])) & \
+                            (new[:,0:3] <= np.array(state['bBox'][1])), axis=1)
+            new = new[inside]
+            time = None if time is None else time[inside]
+
+        # filters applied since setData()
+        # -------------------------------
+        keep = np.ones(len(new), dtype=bool)
+        for name, arguments in self.filters:
+            if name in ['filterIPR','filterBBox']: # open box
+                lo, hi = arguments
+                keep &= np.all((new[:,0:3] > lo) & (new[:,0:3] < hi), axis=1)
+            elif name=='filterNaN':
+                keep &= np.isfinite(new[:,arguments]) if arguments < new.shape[1] else False
+            elif name=='filterTime':
+                t0, t1 = arguments
+                keep &= time != np.iinfo(np.int64).min # NaT
+                if t0 is not None: keep &= time >= t0
+                if t1 is not None: keep &= time < t1
+
+        # append with amortised growth
+        # ----------------------------
+        buffers = state['buffers']
+        n0, pData, current, timeIndex = len(self.pData), self.pData, self.current, self.timeIndex
+
+        buffers['pData'], self.pData = appendRows(buffers.get('pData'), self.pData, new)
+        if time is not None and self.time is not None:
+            buffers['time'], self.time = appendRows(buffers.get('time'), self.time, time)
+        buffers['rows'], self.rows = appendRows(buffers.get('rows'), self.rows, n0 + np.flatnonzero(keep))
+
+        added = new[keep]
+        if current is pData: # no filters or mapData() since setData()
+            self.current = self.pData
+        else:
+            if current.shape[1] > new.shape[1]:
+                added = np.column_stack([added, np.full((len(added), current.shape[1]-new.shape[1]), np.nan)])
+            buffers['current'], self.current = appendRows(buffers.get('current'), current, added)
+
+        # cached state
+        # ------------
+        if len(added):
+            bBox = array3D_BBox(added)
+            self.bBox = bBox if not len(self.bBox) else \
+                        (tuple(map(min, self.bBox[0], bBox[0])), tuple(map(max, self.bBox[1], bBox[1])))
+        self.lattice = None
+
+        if timeIndex is not None and timeIndex[0] is current and timeIndex[1] is None and time is not None:
+            t = time[keep]
+            if np.all(t[1:] >= t[:-1]) and (len(timeIndex[2])==0 or len(t)==0 or t[0] >= timeIndex[2][-1]):
+                buffers['times'], times = appendRows(buffers.get('times'), timeIndex[2], t)
+                self.timeIndex = (self.current, None, times)
+
+        if config.verbose:
+            print (f"tail {fileName}: {len(lines)} lines, {len(added)} of {len(new)} new rows current")
+
+        return len(added)
+
+    # ~def tail()
+
+    def dropLastRow(self, row):
+        """
+        method to remove the last row of self.pData if it equals row (np.array() or None),
+        from self.current and self.rows too, used by tail() for an incomplete last line
+        """
+
+        n = len(self.pData)
+        if row is None or n==0 or not np.array_equal(self.pData[-1], row, equal_nan=True):
+            return
+
+        if self.rows is not None and len(self.rows) and self.rows[-1]==n-1:
+            self.current = self.current[:-1]
+            self.rows = self.rows[:-1]
+        elif self.current is self.pData:
+            self.current = self.current[:-1]
+        self.pData = self.pData[:-1]
+        if self.time is not None:
+            self.time = self.time[:-1]
+        self.bBox = array3D_BBox(self.current) if len(self.current) else ()
+        self.timeIndex = None
+
+    # ~def dropLastRow()
+
+    def setData(self, pData, index, time=None, bBox=None):
+        """
+        method to set self.pData of shape (N, maxCol+1) with columns index and time (N,)
+        int64 epoch ns or None, keeping rows in bBox, and reset the current data set
+        """
+
+        if bBox is not None:
+            inside = np.all((pData[:,0:3] >= np.array(bBox[0])) & (pData[:,0:3] <= np.array(bBox[1])), axis=1)
+            pData = pData[inside]
+            time = None if time is None else time[inside]
+
+        self.pData = pData
+        self.index = index
+        self.maxCol = max(index.values())
+        self.time = time
+
+        self.current = self.pData
+        self.rows = np.arange(len(self.pData))
+        self.bBox = array3D_BBox(self.current) if len(self.current) else ()
+        self.filters = []
+        self.tailState = None
+
+        with config.span('xyzData.read lattice'):
+            self.lattice = array3D_Lattice(self.pData)
+        if config.verbose and self.lattice:
+            print (self.lattice)
+
+    # ~setData()
+
+    def columnNames(self, columns=None):
+        """
+        method to return x,y,z and index names columns (default all) in index order
+        """
 
+        names = sorted(self.index, key=self.index.get) if columns is None else list(columns)
+        return ['x','y','z'] + [n for n in names if n in self.index and n not in ['x','y','z','date']]
+
+    @config.timed('xyzData.write')
+    def write(self, fileName, columns=None, rowGroup=2**20, sort=False):
+        """
+        method to write self.current to csv, Parquet (.parquet, pyarrow) or HDF5 (.h5, h5py)
+
+        - columns: index names to write (default all), x,y,z are always written,
+          dates (self.time) as column 'date'
+        - rows are written in chunks of rowGroup rows (Parquet row groups, HDF5 chunks)
+          with x,y,z bounds per chunk, read(bBox=...) skips chunks outside bBox
+        - sort=True writes rows in Morton order, so that chunks are compact in space
+        - Parquet and HDF5 attribute columns are written in config.floatType(), x,y,z in float64
+        """
+
+        names = self.columnNames(columns)
+        data = self.current[:,[self.index[n] for n in names]]
+        time = None
+        if self.time is not None and self.rows is not None and len(self.rows)==len(data):
+            time = self.time[self.rows]
+
+        if sort and len(data):
+            q = ((data[:,0:3]-data[:,0:3].min(axis=0)) / (np.ptp(data[:,0:3],axis=0)+1e-12) * 1023).astype(np.int64)
+            order = np.argsort(mortonKey(q, 10), kind='stable')
+            data = data[order]
+            time = None if time is None else time[order]
+
+        ext = os.path.splitext(fileName)[1].lower()
+        if ext in ['.parquet','.pq']:
+            pa = config.importOptional('pyarrow')
+            pq = config.importOptional('pyarrow.parquet', 'pyarrow')
+
+            attribute = pa.float32() if config.floatType()==np.float32 else pa.float64()
+            fields = [(n, pa.float64() if n in ['x','y','z'] else attribute) for n in names] + ([('date', pa.timestamp('ns'))] if time is not None else [])
+            schema = pa.schema(fields)
+            with pq.ParquetWriter(fileName, schema) as writer:
+                for c in range(0, max(len(data),1), rowGroup):
+                    arrays = [pa.array(data[c:c+rowGroup,j], type=fields[j][1]) for j in range(len(names))]
+                    if time is not None:
+                        t = time[c:c+rowGroup]
+                        arrays.append(pa.array(t, type=pa.timestamp('ns'), mask=(t==np.iinfo(np.int64).min)))
+                    writer.write_table(pa.Table.from_arrays(arrays, schema=schema), row_group_size=rowGroup)
+
+        elif ext in ['.h5','.hdf5']:
+            h5py = config.importOptional('h5py')
+
+            n, chunk = len(data), max(1, min(rowGroup, len(data)))
+            with h5py.File(fileName, 'w') as f:
+                f.attrs['columns'] = names
+                f.attrs['rowGroup'] = chunk
+                for j, name in enumerate(names):
+                    f.create_dataset(name, shape=(n,), dtype='f8' if name in ['x','y','z'] else config.floatType(), \
+                                     chunks=(chunk,))
+                if time is not None:
+                    f.create_dataset('date', shape=(n,), dtype='i8', chunks=(chunk,))
+                bounds = f.create_dataset('bounds', shape=((n+chunk-1)//chunk, 2, 3), dtype='f8')
+
+                for i, c in enumerate(range(0, n, chunk)):
+                    block = data[c:c+chunk]
+                    for j, name in enumerate(names):
+                        f[name][c:c+chunk] = block[:,j]
+                    if time is not None:
+                        f['date'][c:c+chunk] = time[c:c+chunk]
+                    bounds[i] = [block[:,0:3].min(axis=0), block[:,0:3].max(axis=0)]
+
+        else:
+            header = ','.join(n.upper() if n in ['x','y','z'] else n for n in names)
+            if time is None:
+                np.savetxt(fileName, data, delimiter=',', header=header, comments='', fmt='%.10g')
+            else:
+                with open(fileName, 'w', newline='') as f:
+                    writer = csv.writer(f)
+                    writer.writerow(header.split(',') + ['date'])
+                    dates = np.datetime_as_string(time.view('datetime64[ns]'), unit='s')
+                    for row, d in zip(data.tolist(), dates.tolist()):
+                        writer.writerow([f'{v:.10g}' for v in row] + [d if d!='NaT' else ''])
+
+        config.count('xyzData.rows written', len(data))
+
+    # ~def write(self, fileName)
+
+    @config.timed('xyzData.readParquet')
+    def readParquet(self, fileName, columns=None, bBox=None):
+        """
+        method to read Parquet file, see read()
+
+        only the columns asked for are read, and only row groups whose x,y,z statistics
+        overlap bBox
+        """
+
+        pq = config.importOptional('pyarrow.parquet', 'pyarrow')
+
+        pf = pq.ParquetFile(fileName)
+        available = {n.lower(): n for n in pf.schema_arrow.names}
+        names = ['x','y','z'] + [n for n in (available if columns is None else columns) \
+                                 if n in available and n not in ['x','y','z','date']]
+        readDate = 'date' in available and (columns is None or 'date' in columns)
+
+        groups = list(range(pf.num_row_groups))
+        if bBox is not None:
+            position = {pf.schema_arrow.names[j].lower(): j for j in range(len(pf.schema_arrow.names))}
+            keep = []
+            for g in groups:
+                rg = pf.metadata.row_group(g)
+                overlap = True
+                for d, n in enumerate(['x','y','z']):
+                    stats = rg.column(position[n]).statistics
+                    if stats is not None and stats.has_min_max and \
+                       (stats.max < bBox[0][d] or stats.min > bBox[1][d]):
+                        overlap = False
+                keep.append(overlap)
+            groups = [g for g, k in zip(groups, keep) if k]
+            config.count('xyzData.row groups skipped', pf.num_row_groups-len(groups))
+
+        table = pf.read_row_groups(groups, columns=[available[n] for n in names] + \
+                                                  ([available['date']] if readDate else []))
+        pData = np.column_stack([table.column(available[n]).to_numpy(zero_copy_only=False).astype(np.float64) \
+                                 for n in names]) if len(groups) else np.zeros((0,len(names)))
+        time = None
+        if readDate:
+            t = table.column(available['date']).cast('int64').fill_null(np.iinfo(np.int64).min)
+            time = t.to_numpy().astype(np.int64)
+
+        self.setData(pData, {n: j for j, n in enumerate(names)}, time, bBox)
+
+    # ~def readParquet()
+
+    @config.timed('xyzData.readHDF5')
+    def readHDF5(self, fileName, columns=None, bBox=None):
+        """
+        method to read HDF5 file written by write(), see read()
+
+        only the columns asked for are read, and only chunks whose bounds overlap bBox
+        """
+
+        h5py = config.importOptional('h5py')
+
+        with h5py.File(fileName, 'r') as f:
+            available = [str(n) for n in f.attrs['columns']]
+            names = ['x','y','z'] + [n for n in (available if columns is None else columns) \
+                                     if n in available and n not in ['x','y','z','date']]
+            readDate = 'date' in f and (columns is None or 'date' in columns)
+            chunk = int(f.attrs['rowGroup'])
+            n = len(f['x'])
+
+            # row ranges of chunks overlapping bBox, merged where consecutive
+            bounds = f['bounds'][:]
+            keep = np.ones(len(bounds), dtype=bool)
+            if bBox is not None:
+                keep = np.all((bounds[:,1] >= np.array(bBox[0])) & (bounds[:,0] <= np.array(bBox[1])), axis=1)
+                config.count('xyzData.row groups skipped', int((~keep).sum()))
+            edges = np.flatnonzero(np.diff(np.concatenate([[0], keep.astype(np.int8), [0]])))
+            ranges = [(a*chunk, min(b*chunk, n)) for a, b in zip(edges[0::2], edges[1::2])]
+
+            pData = np.zeros((sum(b-a for a, b in ranges), len(names)))
+            time = np.zeros(len(pData), dtype=np.int64) if readDate else None
+            r = 0
+            for a, b in ranges:
+                for j, name in enumerate(names):
+                    pData[r:r+b-a,j] = f[name][a:b]
+                if readDate:
+                    time[r:r+b-a] = f['date'][a:b]
+                r += b-a
+
+        self.setData(pData, {n: j for j, n in enumerate(names)}, time, bBox)
+
+    # ~def readHDF5()
+
+    @config.timed('xyzData.filterIPR')
     def filterIPR(self, p_IPR):
         """
         method to filter outliers using interpercentile range p_IPR = (0,50)
         """
         l0 = len(self.current)
-        self.current = array3D_IPR(self.pData, p_IPR)
+        inside, limits = array3D_IPR(self.pData, p_IPR, mask=True, limits=True)
+        self.current = self.pData[inside]
+        self.rows = np.flatnonzero(inside)
+        self.filters = [('filterIPR', (np.array(limits)[:,0], np.array(limits)[:,1]))] # from self.pData
         self.bBox = array3D_BBox(self.current)
         
         if config.verbose:
@@ -206,6 +915,7 @@ class xyzData:
         
     # ~filterIPR(self, p_IPR)
 
+    @config.timed('xyzData.filterNaN')
     def filterNaN(self, col):
         """
         method to filter on a column containing NaN
@@ -223,7 +933,11 @@ class xyzData:
                 raise TypeError
             
         l0 = len(self.current)
-        self.current = self.current[np.isfinite(self.current[:,col])]
+        finite = np.isfinite(self.current[:,col])
+        self.current = self.current[finite]
+        if self.rows is not None: # None if set directly without read() / setData()
+            self.rows = self.rows[finite]
+        self.filters.append(('filterNaN', col))
  
         if config.verbose: print (f"filterNaN '{colStr}' [{col}] removed {l0-len(self.current)} lines")
 
@@ -232,6 +946,7 @@ class xyzData:
         
     # ~filterNaN(self):
 
+    @config.timed('xyzData.filterBBox')
     def filterBBox(self, bBox, offset=0.0):
         """
         method to filter on a bounding box
@@ -240,10 +955,14 @@ class xyzData:
                                   (bBox[1][0]+offset,bBox[1][1]+offset,bBox[1][2]+offset) 
         
         l0 = len(self.current)
-        self.current = self.current[( \
+        inside = ( \
             (self.current[:,0] > x0) & (self.current[:,0] < x1) & \
             (self.current[:,1] > y0) & (self.current[:,1] < y1) & \
-            (self.current[:,2] > z0) & (self.current[:,2] < z1) )]
+            (self.current[:,2] > z0) & (self.current[:,2] < z1) )
+        self.current = self.current[inside]
+        if self.rows is not None: # None if set directly without read() / setData()
+            self.rows = self.rows[inside]
+        self.filters.append(('filterBBox', (np.array([x0,y0,z0]), np.array([x1,y1,z1]))))
 
         if config.verbose: print (f"filterBBox {bBox} offset {offset} removed {l0-len(self.current)} lines")
             
@@ -252,6 +971,111 @@ class xyzData:
         
     # ~filterBBox(self):
 
+    def timeSorted(self):
+        """
+        method to return (order, times) with self.current[order] sorted by time,
+        order is None if self.current is already in time order
+
+        cached until self.current changes
+        """
+
+        if self.time is None:
+            print ('Error: no date column read')
+            raise TypeError
+
+        if self.timeIndex is None or self.timeIndex[0] is not self.current:
+            with config.span('xyzData.timeSorted'):
+                t = self.time[self.rows]
+                if np.all(t[1:] >= t[:-1]):
+                    order = None
+                else:
+                    order = np.argsort(t, kind='stable')
+                    t = t[order]
+            self.timeIndex = (self.current, order, t)
+
+        return self.timeIndex[1], self.timeIndex[2]
+
+    # ~timeSorted()
+
+    def timeBounds(self, start, end):
+        """
+        method to return index bounds i0, i1 into the time sorted self.current for
+        windows start <= t < end (scalars or arrays, see toTime()), NaT excluded
+        """
+
+        order, t = self.timeSorted()
+        nat = np.searchsorted(t, np.iinfo(np.int64).min, side='right')
+
+        i0 = nat if start is None else np.maximum(np.searchsorted(t, start), nat)
+        i1 = len(t) if end is None else np.maximum(np.searchsorted(t, end), i0)
+
+        return i0, i1
+
+    # ~timeBounds()
+
+    @config.timed('xyzData.filterTime')
+    def filterTime(self, start=None, end=None):
+        """
+        method to filter on time start <= t < end
+
+        start, end: None (open), int epoch ns, str or np.datetime64
+        """
+
+        l0 = len(self.current)
+        order, t = self.timeSorted()
+        i0, i1 = self.timeBounds(toTime(start), toTime(end))
+
+        if order is None:
+            select = slice(i0, i1)
+        else:
+            select = np.sort(order[i0:i1]) # keep current row order
+        self.current = self.current[select]
+        self.rows = self.rows[select]
+        self.filters.append(('filterTime', (toTime(start), toTime(end))))
+
+        if config.verbose: print (f"filterTime {start} - {end} removed {l0-len(self.current)} lines")
+
+        self.bBox = array3D_BBox(self.current) if len(self.current) else ()
+        return self.current
+
+    # ~filterTime(self, start, end)
+
+    def timeWindows(self, length, step=None, start=None, end=None, starts=None):
+        """
+        generator of time windows over self.current (composes with the spatial filters)
+
+        - starts: window start times, e.g. blast times, each window [s, s+length)
+        - else regular windows from start (default first event) to end (default last event)
+          every step (default length)
+        length, step: int ns or np.timedelta64
+
+        yields (t0, t1, np.array() of rows in time order), t0, t1 as int64 epoch ns
+        """
+
+        order, t = self.timeSorted()
+        length = np.timedelta64(length, 'ns').astype(np.int64)
+
+        if starts is None:
+            step = length if step is None else np.timedelta64(step, 'ns').astype(np.int64)
+            n0, n1 = self.timeBounds(None, None)
+            if n0 == n1:
+                return
+            start = t[n0] if start is None else toTime(start)
+            end = t[n1-1]+1 if end is None else toTime(end)
+            starts = np.arange(start, end, step, dtype=np.int64)
+        else:
+            starts = np.array([toTime(s) for s in np.atleast_1d(starts)], dtype=np.int64)
+
+        i0, i1 = self.timeBounds(starts, starts+length)
+        config.count('xyzData.time windows', len(starts))
+
+        for s, a, b in zip(starts, i0, i1):
+            rows = slice(a, b) if order is None else order[a:b]
+            yield s, s+length, self.current[rows]
+
+    # ~timeWindows()
+
+    @config.timed('xyzData.extractArrayN4')
     def extractArrayN4(self, col):
         """
         method to extract np.array() of shape (N, 4)
@@ -272,9 +1096,11 @@ class xyzData:
     
     # ~extractArrayN4(self, col)
 
+    @config.timed('xyzData.extractStress')
     def extractStress(self, indices='default', xyz=False):
         """
-        method to extract np.array() of shape (N, 6) or (N, 9) if xyz=True
+        method to extract np.array() of shape (N, 6) in config.floatType()
+        or (N, 9) float64 if xyz=True
         
         arguments:
         -indices:       stress column notation
@@ -297,34 +1123,36 @@ class xyzData:
             return np.hstack((self.current[:,0:3], \
                    np.hstack([self.current[:,col[i]].reshape(-1, 1) for i in range(6)])))
         else:
-            return np.hstack([self.current[:,col[i]].reshape(-1, 1) for i in range(6)])
+            return self.current[:,col].astype(config.floatType())
 
     # ~extractStress()
 
-    def mapData(self, source, newIndex='mapData-1', overwrite=True, maxDist=False, fill=np.nan):
+    @config.timed('xyzData.mapData')
+    def mapData(self, source, newIndex='mapData-1', overwrite=True, maxDist=False, fill=np.nan, \
+                interpolate='nearest'):
         """
         method to map data from source to self using kdTree
         - one column from np.array of shape (N, 4) into newIndex
         - all columns from xyzData class object with new indices from source.index
+
+        interpolate:
+        - 'nearest' (default): nearest point, by index arithmetic on a regular lattice
+        - 'auto': trilinear if source is a regular lattice (source.lattice), else nearest,
+          blends every column (not for categorical columns such as IDs, nan spreads)
+        - 'linear': trilinear, requires a regular lattice
+        - 'exact': same x,y,z within 1e-3, see join(), unmatched points get fill
+        maxDist is tested against the distance to the nearest source point
         """
         
         # source data
         # -----------
-        if isinstance(source,np.ndarray):
-            sourceData = source
-        elif isinstance(source,xyzData):
-            sourceData = source.current
-        else:
+        if not isinstance(source,(np.ndarray,xyzData)):
             return
+        valid, sourceColumn = self.locate(source, interpolate, maxDist)
         
         # target data
         # -----------
         targetData = self.current
-        
-        # kdTree
-        # ------
-        kdtree=KDTree(sourceData[:,0:3])
-        dist,points=kdtree.query(targetData[:,0:3],1) # for ,2: points[i] becomes list
 
         if isinstance(source,np.ndarray): # map one column only
 
@@ -338,11 +1166,7 @@ class xyzData:
                 # create new column with zeros
                 targetData = np.hstack([targetData,np.zeros([len(targetData),1])])
     
-                for i in range(len(points)):
-                    if (maxDist is False) or (dist[i]<=maxDist):
-                        targetData[i,targetCol]=sourceData[points[i],3]
-                    else:
-                        targetData[i,targetCol]=fill
+                targetData[:,targetCol] = np.where(valid, sourceColumn(3), fill)
 
         elif isinstance(source,xyzData): # map all columns
 
@@ -353,17 +1177,294 @@ class xyzData:
                     self.index[col]=self.maxCol
                     targetData = np.hstack([targetData,np.zeros([len(targetData),1])])
             # map data
-            for i in range(len(points)):    
-                for col in source.index.keys():
-                    if col not in ['x','y','z']:
-                        if (col not in self.index.keys()) or overwrite:
-                            if (maxDist is False) or (dist[i]<=maxDist):
-                                targetData[i,self.index[col]]=sourceData[points[i],source.index[col]]
-                            else:
-                                targetData[i,self.index[col]]=fill  
+            for col in source.index.keys():
+                if col not in ['x','y','z']:
+                    if (col not in self.index.keys()) or overwrite:
+                        targetData[:,self.index[col]] = np.where(valid, sourceColumn(source.index[col]), fill)
         else:
             return
 
         self.current = targetData
 
-    # ~def mapData(self, source, newIndex='mapData-1')
\ No newline at end of file
+    # ~def mapData(self, source, newIndex='mapData-1')
+
+    def locate(self, source, interpolate='nearest', maxDist=False):
+        """
+        method to locate self.current in source (xyzData or np.array() of shape (N, 4)),
+        see mapData() for interpolate and maxDist
+
+        returns valid (N,) and function sourceColumn(col) of source values at self.current
+        """
+
+        sourceData = source.current if isinstance(source,xyzData) else source
+        targetData = self.current
+
+        # exact join on quantized x,y,z, no kdTree
+        # ----------------------------------------
+        lattice = None
+        if interpolate=='exact':
+            with config.span('xyzData.locate join'):
+                match = self.join(source)
+            dist = np.where(match >= 0, 0.0, np.inf)
+            def sourceColumn(col): return sourceData[np.maximum(match,0),col]
+
+        # regular lattice: index arithmetic, no kdTree
+        # --------------------------------------------
+        elif isinstance(source,xyzData) and source.lattice and source.current is source.pData:
+            lattice = source.lattice
+        elif isinstance(source,np.ndarray) and interpolate=='linear':
+            lattice = array3D_Lattice(source)
+        if interpolate=='linear' and lattice is None:
+            print ('locate: interpolate=\'linear\' requires a regular lattice source')
+            raise TypeError
+
+        if interpolate=='exact':
+            pass
+        elif lattice is not None:
+            with config.span('xyzData.locate lattice'):
+                mapped, dist = lattice.interpolate(targetData, linear=(interpolate!='nearest'))
+            def sourceColumn(col): return mapped[:,col]
+        else:
+            # kdTree, nearest source points memoized if config.cacheDir is set
+            # ---------------------------------------------------------------
+            def query():
+                if isinstance(source,xyzData):
+                    kdtree=source.kdTree()
+                else:
+                    from scipy.spatial import KDTree
+                    kdtree=KDTree(sourceData[:,0:3])
+                config.count('KDTree queries', len(targetData))
+                return kdtree.query(targetData[:,0:3],1) # for ,2: points[i] becomes list
+
+            with config.span('xyzData.locate KDTree'):
+                dist,points=config.cached('locate', [targetData[:,0:3], sourceData[:,0:3]], query)
+            def sourceColumn(col): return sourceData[points,col]
+
+        valid = np.isfinite(dist) # unmatched rows of the exact join
+        if maxDist is not False:
+            valid &= dist<=maxDist
+        return valid, sourceColumn
+
+    # ~def locate(self, source)
+
+    def addColumns(self, columns):
+        """
+        method to add or overwrite columns {name: np.array() (N,)} of self.current,
+        new columns are appended in one copy
+        """
+
+        new = [name for name in columns if name not in self.index]
+        nCol = self.current.shape[1]
+        if new:
+            targetData = np.empty((len(self.current), nCol+len(new)))
+            targetData[:,:nCol] = self.current
+            for j, name in enumerate(new):
+                self.index[name] = nCol+j
+            self.maxCol = nCol+len(new)-1
+            self.current = targetData
+        elif not self.current.flags.writeable: # e.g. shared memory view
+            self.current = self.current.copy()
+        for name, values in columns.items():
+            self.current[:,self.index[name]] = values
+
+    # ~def addColumns(self, columns)
+
+    @config.timed('xyzData.mapMany')
+    def mapMany(self, sources, overwrite=True, maxDist=False, fill=np.nan, interpolate='nearest', workers=None):
+        """
+        method to map several sources onto self in one pass, as repeated mapData()
+        - sources: list of xyzData (all columns) or (np.array of shape (N, 4), newIndex) (one column)
+        - all new columns are planned and preallocated, self.current is copied once
+        - source lookups (locate()) run concurrently in a thread pool of workers threads
+          (default one per source), later sources overwrite earlier ones
+        """
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        # plan: target column for every source column
+        # -------------------------------------------
+        index = dict(self.index)
+        nCol = self.current.shape[1]
+        plan = [] # (source number, target column, source column)
+
+        for s, source in enumerate(sources):
+            if isinstance(source,xyzData):
+                columns = [(col, source.index[col]) for col in source.index if col not in ['x','y','z']]
+            elif isinstance(source,tuple) and isinstance(source[0],np.ndarray):
+                columns = [(source[1], 3)]
+            else:
+                print ('Error: mapMany requires xyzData or (np.ndarray, newIndex) sources')
+                raise TypeError
+
+            for col, sourceCol in columns:
+                if col not in index:
+                    index[col] = nCol
+                    nCol += 1
+                elif not overwrite and col in self.index:
+                    continue
+                plan.append((s, index[col], sourceCol))
+
+        # concurrent lookups
+        # ------------------
+        data = [source if isinstance(source,xyzData) else source[0] for source in sources]
+        with ThreadPoolExecutor(max_workers=workers or max(len(data),1)) as pool:
+            located = list(pool.map(lambda source: self.locate(source, interpolate, maxDist), data))
+
+        # fused write into preallocated columns
+        # -------------------------------------
+        targetData = np.empty((len(self.current), nCol))
+        targetData[:,:self.current.shape[1]] = self.current
+        targetData[:,self.current.shape[1]:] = fill
+
+        for s, targetCol, sourceCol in plan:
+            valid, sourceColumn = located[s]
+            targetData[:,targetCol] = np.where(valid, sourceColumn(sourceCol), fill)
+        config.count('xyzData.columns mapped', len(plan))
+
+        self.index = index
+        self.maxCol = nCol-1
+        self.current = targetData
+
+    # ~def mapMany(self, sources)
+
+    @config.timed('xyzData.join')
+    def join(self, source, tol=1e-3):
+        """
+        method to align source (xyzData or np.array() of shape (N, 3 or more)) to self.current
+        by exact x,y,z quantized to tol
+
+        - same nodes in the same order (e.g. read with nodes=): no search
+        - else source keys are looked up in the sorted keys of self.current, cached for
+          joining further sources (model stages)
+
+        returns index into source rows for each row of self.current, -1 if unmatched
+        """
+
+        sourceData = source.current if isinstance(source,xyzData) else source
+        n = len(self.current)
+
+        if len(sourceData)==n and np.all(np.abs(sourceData[:,0:3]-self.current[:,0:3]) <= tol/2):
+            config.count('xyzData.join identity')
+            return np.arange(n)
+
+        if self.nodeIndex is None or self.nodeIndex[0] is not self.current or self.nodeIndex[1]!=tol:
+            keys, lo, dims = array3D_Keys(self.current, tol)
+            order = np.argsort(keys, kind='stable')
+            self.nodeIndex = (self.current, tol, lo, dims, keys[order], order)
+        _, _, lo, dims, sortedKeys, order = self.nodeIndex
+
+        keys = array3D_Keys(sourceData, tol, lo, dims)[0]
+        pos = np.minimum(np.searchsorted(sortedKeys, keys), n-1)
+        found = sortedKeys[pos]==keys
+        if keys.dtype.kind!='V':
+            found &= keys >= 0
+
+        match = np.full(n, -1)
+        match[order[pos[found]]] = np.flatnonzero(found)
+        config.count('xyzData.join matched', int(found.sum()))
+
+        return match
+
+    # ~def join(self, source)
+
+    def delta(self, source, cols, tol=1e-3):
+        """
+        method to difference columns cols (index names) of self.current minus source,
+        rows aligned with join()
+
+        returns np.array() of shape (N, len(cols)), nan where unmatched
+        """
+
+        cols = [cols] if isinstance(cols,str) else cols
+        match = self.join(source, tol)
+        mine = self.current[:,[self.index[c] for c in cols]]
+        theirs = source.current[np.maximum(match,0)][:,[source.index[c] for c in cols]]
+
+        return np.where((match >= 0)[:,None], mine - theirs, np.nan)
+
+    # ~def delta(self, source, cols)
+
+    def kdTree(self):
+        """
+        method to return KDTree of self.current, rebuilt only if self.current changed
+        """
+
+        if self.tree is None or self.tree[0] is not self.current:
+            from scipy.spatial import KDTree
+
+            with config.span('xyzData.kdTree'):
+                self.tree = (self.current, KDTree(self.current[:,0:3]))
+            config.count('KDTree builds')
+
+        return self.tree[1]
+
+    # ~def kdTree()
+
+    @config.timed('xyzData.sample')
+    def sample(self, points, cols=None, maxDist=False, fill=np.nan, interpolate='nearest'):
+        """
+        method to sample columns cols at points of shape (..., 3)
+
+        - cols: list of index names (default all but x,y,z), a single name drops the last axis
+        - interpolate and maxDist as mapData()
+        - regular lattice: index arithmetic (trilinear for 'auto', 'linear'), else nearest
+          point of the cached kdTree()
+
+        returns np.array() of shape (..., len(cols))
+        """
+
+        names = [c for c in self.index if c not in ['x','y','z']] if cols is None else cols
+        idx = [self.index[c] for c in ([names] if isinstance(names,str) else names)]
+
+        points = np.asarray(points, dtype=np.float64)
+        shape = points.shape[:-1]
+        points = points.reshape(-1,3)
+
+        lattice = self.lattice if (self.lattice and self.current is self.pData) else None
+        if interpolate=='linear' and lattice is None:
+            print ('sample: interpolate=\'linear\' requires a regular lattice')
+            raise TypeError
+
+        if lattice is not None:
+            values, dist = lattice.interpolate(points, cols=idx, linear=(interpolate!='nearest'))
+        else:
+            dist, near = self.kdTree().query(points, 1)
+            values = self.current[near][:,idx]
+        if maxDist is not False:
+            values[dist>maxDist] = fill
+        config.count('xyzData.points sampled', len(points))
+
+        values = values.reshape(shape + (len(idx),))
+        return values[...,0] if isinstance(names,str) else values
+
+    # ~def sample(self, points, cols=None)
+
+    def sampleSection(self, centre, dip, ddir, width, height, resolution, cols=None, **kwargs):
+        """
+        method to sample a plane section, see planePoints() and sample()
+
+        returns u (nu,), v (nv,), points (nv, nu, 3) and values (nv, nu, len(cols))
+        """
+
+        u, v, points = planePoints(centre, dip, ddir, width, height, resolution)
+        return u, v, points, self.sample(points, cols, **kwargs)
+
+    def sampleLine(self, polyline, resolution, cols=None, **kwargs):
+        """
+        method to sample along a polyline, see linePoints() and sample()
+
+        returns chainage (N,), points (N, 3) and values (N, len(cols))
+        """
+
+        chainage, points = linePoints(polyline, resolution)
+        return chainage, points, self.sample(points, cols, **kwargs)
+
+    def sampleBox(self, bBox, resolution, cols=None, **kwargs):
+        """
+        method to sample a regular box, see boxPoints() and sample()
+
+        returns points (nx, ny, nz, 3) and values (nx, ny, nz, len(cols))
+        """
+
+        points = boxPoints(bBox, resolution)
+        return points, self.sample(points, cols, **kwargs)